@@ -0,0 +1,129 @@
+'''Batch solving of Sokoban problems.
+
+   solve_batch() solves a list of initial states with one strategy and
+   heuristic under a per-problem time bound, fanning the problems out over a
+   pool of worker processes. Results come back in the order of the input
+   states, whatever order the workers finish in.
+
+   From the command line:
+
+       python batch.py --strategy astar --heuristic heur_alternate --timebound 2 --workers 4
+
+   or, for the levels of a level file (see levels.py), writing the solutions
+   found in LURD notation:
+
+       python batch.py --levels pack.txt --solutions pack.lurd
+'''
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import solution
+from levels import load_levels, lurd
+from search import SearchEngine
+from sokoban import PROBLEMS, sokoban_goal_state
+
+# strategies that solve_batch accepts besides the SearchEngine ones
+_SOLUTION_STRATEGIES = ('weighted_astar', 'iterative_astar', 'iterative_gbfs')
+_ENGINE_STRATEGIES = ('depth_first', 'breadth_first', 'ucs', 'best_first', 'astar')
+
+
+class BatchResult:
+    '''The outcome of solving one problem of a batch'''
+
+    def __init__(self, index, final, stats):
+        self.index = index
+        self.solved = bool(final)
+        self.cost = final.gval if final else None
+        # the final state is sent back without its parent chain, so keep the path as actions
+        self.actions = final.path_actions() if final else None
+        self.final = final or None
+        self.stats = stats
+
+    def __str__(self):
+        if self.solved:
+            return f'problem {self.index}: solved, cost {self.cost}, {self.stats.states_expanded} states explored'
+        return f'problem {self.index}: unsolved'
+
+
+def solve_one(index, state, strategy, heur_fn, timebound, weight=None, cc_level='default'):
+    '''Solves a single problem and returns a BatchResult'''
+    if strategy == 'weighted_astar':
+        final, stats = solution.weighted_astar(state, heur_fn, weight, timebound)
+    elif strategy == 'iterative_astar':
+        final, stats = solution.iterative_astar(state, heur_fn, weight, timebound)
+    elif strategy == 'iterative_gbfs':
+        final, stats = solution.iterative_gbfs(state, heur_fn, timebound)
+    else:
+        se = SearchEngine(strategy, cc_level)
+        se.init_search(state, goal_fn=sokoban_goal_state, heur_fn=heur_fn)
+        final, stats = se.search(timebound)
+    return BatchResult(index, final, stats)
+
+
+def _solve_task(task):
+    return solve_one(*task)
+
+
+def solve_batch(states, strategy='astar', heur_fn=solution.heur_alternate, timebound=2, workers=None, weight=1,
+                cc_level='default'):
+    '''
+    Solves every state in states and returns a list of BatchResult objects, one per state, in the same order.
+
+    @param states: the initial states to solve.
+    @param strategy: a SearchEngine strategy or one of 'weighted_astar', 'iterative_astar', 'iterative_gbfs'.
+    @param heur_fn: the heuristic; it is sent to the workers by reference, so it must be a module level function.
+    @param timebound: the time bound, in seconds, for each problem.
+    @param workers: the number of worker processes (defaults to the number of CPUs; 1 solves in this process).
+    @param weight: the weight used by the weighted and iterative a-star strategies.
+    @param cc_level: the cycle checking level for the SearchEngine strategies.
+    '''
+    if strategy not in _ENGINE_STRATEGIES + _SOLUTION_STRATEGIES:
+        raise Exception("Unknown batch strategy {}, must be one of {}".format(
+            strategy, _ENGINE_STRATEGIES + _SOLUTION_STRATEGIES))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    tasks = [(i, state, strategy, heur_fn, timebound, weight, cc_level) for i, state in enumerate(states)]
+
+    if workers == 1:
+        return [_solve_task(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=min(workers, max(len(tasks), 1))) as executor:
+        # map preserves the order of the tasks
+        return list(executor.map(_solve_task, tasks))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Solve the Sokoban problem set in parallel.')
+    parser.add_argument('--strategy', default='astar')
+    parser.add_argument('--heuristic', default='heur_alternate', help='name of a heuristic in solution.py')
+    parser.add_argument('--timebound', type=float, default=2)
+    parser.add_argument('--weight', type=float, default=1)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--problems', type=int, nargs='*', help='indices into PROBLEMS (default: all)')
+    parser.add_argument('--levels', help='solve the levels of this level file instead of PROBLEMS')
+    parser.add_argument('--solutions', help='file to write the solutions found to, in LURD notation')
+    args = parser.parse_args(argv)
+
+    if args.levels:
+        names, states = zip(*load_levels(args.levels))
+        indices = range(len(states))
+    else:
+        indices = args.problems if args.problems else range(len(PROBLEMS))
+        names = ['problem {}'.format(i) for i in indices]
+        states = [PROBLEMS[i] for i in indices]
+    results = solve_batch(states, args.strategy, getattr(solution, args.heuristic), args.timebound, args.workers,
+                          args.weight)
+    for i, result in zip(indices, results):
+        result.index = i
+        print(result)
+    print("Solved {} of {} problems.".format(sum(r.solved for r in results), len(results)))
+
+    if args.solutions:
+        with open(args.solutions, 'w') as f:
+            for name, state, result in zip(names, states, results):
+                # the results only carry the actions, so replay them to recover which steps push a box
+                f.write('{}: {}\n'.format(name, lurd(state.replay(result.actions)) if result.solved else 'unsolved'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+'''Benchmarks for the search engine and the Sokoban domain.
+
+   memory_benchmark() measures how many bytes every generated Sokoban state
+   (together with the search node that holds it on OPEN) costs, by
+   generating states breadth first and keeping all of them alive the way a
+   search with full cycle checking does.
+
+   heuristic_benchmark() runs A* with several heuristics over the problem
+   set and compares the states explored and the wall time each one needs.
+
+   run_suite() runs every strategy/heuristic combination over a set of
+   problems several times, each run in a fresh process, and records the
+   states explored and generated, the peak memory, the states explored per
+   second and the wall time of each; compare() reports where a suite's
+   results regressed against a baseline saved from an earlier one. From the
+   command line:
+
+       python benchmark.py suite --output new.json --baseline old.json --threshold 0.1
+
+   exits with status 1 if anything regressed by more than the threshold.
+'''
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # not on Unix: peak memory is not recorded
+    resource = None
+
+import solution
+from generator import scaling_problems
+from search import sNode, SearchEngine
+from sokoban import PROBLEMS, sokoban_goal_state, sokoban_goal_states
+from solution import heur_manhattan_distance, heur_alternate, heur_matching
+
+SUITE_CONFIGS = ('astar:heur_manhattan_distance', 'astar:heur_alternate', 'astar:heur_matching',
+                 'best_first:heur_alternate', 'ida_star:heur_matching')
+
+
+def memory_benchmark(problem=PROBLEMS[19], n_states=100000):
+    '''Returns the average number of bytes allocated per generated state
+       (and its search node) when n_states states are generated from problem.'''
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+
+    nodes = []
+    frontier = deque([problem])
+    while frontier and len(nodes) < n_states:
+        for succ in frontier.popleft().successors():
+            nodes.append(sNode(succ, 0, None))
+            frontier.append(succ)
+
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (end - start) / len(nodes)
+
+
+def heuristic_benchmark(heuristics=(heur_manhattan_distance, heur_alternate, heur_matching), problems=PROBLEMS,
+                        timebound=2):
+    '''Runs A* with each heuristic on each problem and prints, per problem, the solution cost, the states explored and
+       the wall time (in seconds) for every heuristic, followed by the totals over the problems all of them solved.'''
+    names = [heur_fn.__name__ for heur_fn in heuristics]
+    print('problem  ' + ''.join('{:>36}'.format(name + ' cost/explored/time') for name in names))
+    totals = dict((name, [0, 0, 0.0]) for name in names)
+    for i, problem in enumerate(problems):
+        row = []
+        for heur_fn in heuristics:
+            se = SearchEngine('astar', 'full')
+            se.init_search(problem, goal_fn=sokoban_goal_state, heur_fn=heur_fn)
+            start = time.perf_counter()
+            final, stats = se.search(timebound)
+            row.append((final.gval if final else None, stats.states_expanded, time.perf_counter() - start))
+        print('{:>7}  '.format(i) + ''.join('{:>36}'.format('{}/{}/{:.2f}'.format(*result)) for result in row))
+        if all(result[0] is not None for result in row):
+            for name, result in zip(names, row):
+                totals[name][0] += 1
+                totals[name][1] += result[1]
+                totals[name][2] += result[2]
+    for name in names:
+        print('{}: {} states explored in {:.2f}s over the {} problems every heuristic solved'.format(
+            name, totals[name][1], totals[name][2], totals[name][0]))
+
+
+def suite_problems(indices=None):
+    '''The (name, initial state) pairs of PROBLEMS (or of the given indices into it) for run_suite.'''
+    if indices is None:
+        indices = range(len(PROBLEMS))
+    return [('sokoban-{}'.format(i), PROBLEMS[i]) for i in indices]
+
+
+def _run(task):
+    '''Runs one search of the suite (in a fresh worker process) and returns its measurements.'''
+    config, state, timebound = task
+    strategy, heuristic = config.split(':')
+    heur_fn = getattr(solution, heuristic)
+    memory_start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+
+    se = SearchEngine(strategy)
+    start = time.perf_counter()
+    se.init_search(state, goal_fn=sokoban_goal_state, heur_fn=heur_fn,
+                   goal_states=sokoban_goal_states(state) if strategy == 'bidirectional' else None)
+    final, stats = se.search(timebound)
+    wall_time = time.perf_counter() - start
+
+    peak_memory = None
+    if resource:
+        # ru_maxrss is in kilobytes on Linux (bytes on macOS)
+        scale = 1 if sys.platform == 'darwin' else 1024
+        peak_memory = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memory_start) * scale
+    return final.gval if final else None, stats.states_expanded, stats.states_generated, peak_memory, wall_time
+
+
+def run_suite(configs=SUITE_CONFIGS, problems=None, repeats=3, timebound=2):
+    '''
+    Runs every configuration on every problem repeats times and returns the results, ready to be saved as JSON.
+    Every run gets a fresh process, so no run profits from the caches (heuristic caches, precomputed maps) another
+    run has filled, and so the growth of its peak resident memory is its own. The problem is sent to it pickled, which
+    leaves out the tables cached on its map (see SokobanMap.__getstate__).
+
+    @param configs: 'strategy:heuristic' strings, the heuristic being the name of a function in solution.py.
+    @param problems: (name, initial state) pairs (defaults to suite_problems()).
+    @param repeats: the number of runs of each configuration on each problem; the median wall time is recorded.
+    @param timebound: the time bound, in seconds, of every run.
+    '''
+    if problems is None:
+        problems = suite_problems()
+    results = []
+    for config in configs:
+        for name, state in problems:
+            runs = []
+            for _ in range(repeats):
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    runs.append(executor.submit(_run, (config, state, timebound)).result())
+            cost, states_expanded, states_generated, _, _ = runs[0]
+            wall_time = statistics.median(run[4] for run in runs)
+            memory = [run[3] for run in runs if run[3] is not None]
+            results.append({'config': config, 'problem': name, 'solved': cost is not None, 'cost': cost,
+                            'states_expanded': states_expanded, 'states_generated': states_generated,
+                            'peak_memory': max(memory) if memory else None, 'wall_time': wall_time,
+                            'nodes_per_sec': states_expanded / wall_time if wall_time > 0 else None})
+            print('{:<36} {:<26} cost {:<6} {:>9} explored {:>9.0f}/s {:>8.3f}s'.format(
+                config, name, str(cost), states_expanded, results[-1]['nodes_per_sec'] or 0, wall_time))
+    return {'python': platform.python_version(), 'repeats': repeats, 'timebound': timebound, 'results': results}
+
+
+def compare(suite, baseline, threshold=0.1, min_time=0.01, min_memory=1 << 20):
+    '''
+    Returns a list of the regressions of suite against baseline (both as returned by run_suite), as strings.
+    For a run both solved, it regresses if it no longer finds as cheap a solution, or if its wall time, the states it
+    explores or its peak memory grew by more than threshold (a fraction), ignoring changes under min_time seconds and
+    min_memory bytes. For a run neither solved (which stops at the time bound), it regresses if it explores fewer
+    states per second by more than threshold. A run that is no longer solved always regresses.
+    '''
+    old = dict(((result['config'], result['problem']), result) for result in baseline['results'])
+    regressions = []
+    for result in suite['results']:
+        before = old.get((result['config'], result['problem']))
+        if before is None:
+            continue
+        name = '{} on {}'.format(result['config'], result['problem'])
+        if before['solved'] and not result['solved']:
+            regressions.append('{}: no longer solved'.format(name))
+        elif before['solved']:
+            if result['cost'] > before['cost']:
+                regressions.append('{}: cost {} -> {}'.format(name, before['cost'], result['cost']))
+            if result['wall_time'] > before['wall_time'] * (1 + threshold) \
+                    and result['wall_time'] - before['wall_time'] > min_time:
+                regressions.append('{}: wall time {:.3f}s -> {:.3f}s'.format(
+                    name, before['wall_time'], result['wall_time']))
+            if result['states_expanded'] > before['states_expanded'] * (1 + threshold):
+                regressions.append('{}: states explored {} -> {}'.format(
+                    name, before['states_expanded'], result['states_expanded']))
+            if result['peak_memory'] is not None and before['peak_memory'] is not None \
+                    and result['peak_memory'] > before['peak_memory'] * (1 + threshold) \
+                    and result['peak_memory'] - before['peak_memory'] > min_memory:
+                regressions.append('{}: peak memory {} -> {} bytes'.format(
+                    name, before['peak_memory'], result['peak_memory']))
+        elif not result['solved'] and before['nodes_per_sec'] and result['nodes_per_sec'] is not None \
+                and result['nodes_per_sec'] < before['nodes_per_sec'] / (1 + threshold):
+            regressions.append('{}: states explored per second {:.0f} -> {:.0f}'.format(
+                name, before['nodes_per_sec'], result['nodes_per_sec']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the search engine on the Sokoban problems.')
+    commands = parser.add_subparsers(dest='command')
+    suite = commands.add_parser('suite', help='run the benchmark suite and compare it with a baseline')
+    suite.add_argument('--configs', nargs='*', default=SUITE_CONFIGS, help='strategy:heuristic combinations')
+    suite.add_argument('--problems', type=int, nargs='*', help='indices into PROBLEMS (default: all)')
+    suite.add_argument('--generated', action='store_true', help='add the generated problems of scaling_problems()')
+    suite.add_argument('--repeats', type=int, default=3)
+    suite.add_argument('--timebound', type=float, default=2)
+    suite.add_argument('--output', help='file to save the results to, as JSON')
+    suite.add_argument('--baseline', help='results saved from an earlier run to compare with')
+    suite.add_argument('--threshold', type=float, default=0.1, help='regression threshold, as a fraction')
+    args = parser.parse_args(argv)
+
+    if args.command != 'suite':
+        print('bytes per generated state: {:.1f}'.format(memory_benchmark()))
+        heuristic_benchmark()
+        return 0
+
+    problems = suite_problems(args.problems)
+    if args.generated:
+        problems = problems + scaling_problems()
+    results = run_suite(args.configs, problems, args.repeats, args.timebound)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        print('{} regressions against {}'.format(len(regressions), args.baseline))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,240 @@
+'''External memory search: breadth first search and uniform cost search that
+   keep their frontier and closed list on disk instead of in memory.
+
+   ExternalSearchEngine searches layer by layer, a layer being the states at
+   one depth (breadth_first) or with one gval (ucs). States are stored
+   packed (see StateSpace.pack) as records of a fixed size, and duplicates
+   are detected late (delayed duplicate detection): successors are appended
+   to an in-memory buffer per layer, and whenever the buffers together go
+   over the RAM budget the biggest one is sorted, cleared of duplicates and
+   spilled to disk as a run. Before a layer is expanded, its runs are merged
+   (read through memory maps) and every state already expanded in an earlier
+   layer is dropped by merging against the sorted file of all of them. Only
+   the buffers and one record per open file are ever in memory, so the
+   searches are bounded by the disk rather than by RAM.
+
+   Only states are stored, not how they were reached: the path to a goal is
+   recovered by scanning the earlier layers for a state with the goal (then
+   that state) as a successor, once per action on the path.
+
+       engine = ExternalSearchEngine('breadth_first', ram_budget=256 << 20)
+       engine.init_search(PROBLEMS[0], sokoban_goal_state)
+       final, stats = engine.search(timebound=3600)
+'''
+import heapq
+import mmap
+import os
+import shutil
+import tempfile
+
+from search import Deadline, SearchStats
+
+
+def _read_run(path, size):
+    '''Generates the records of the file at path, read through a memory map.'''
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for offset in range(0, len(data), size):
+                yield data[offset:offset + size]
+
+
+def _unique(records):
+    '''Generates the sorted records, skipping repeats.'''
+    last = None
+    for record in records:
+        if record != last:
+            yield record
+            last = record
+
+
+def _subtract(records, removed):
+    '''Generates the sorted records that are not among the sorted removed records.'''
+    removed = iter(removed)
+    current = next(removed, None)
+    for record in records:
+        while current is not None and current < record:
+            current = next(removed, None)
+        if record != current:
+            yield record
+
+
+class ExternalSearchEngine:
+    def __init__(self, strategy='breadth_first', ram_budget=64 << 20, directory=None):
+        '''
+        @param strategy: 'breadth_first' (layers by depth) or 'ucs' (layers by gval).
+        @param ram_budget: the most bytes of packed successors to buffer in memory before spilling a run to disk.
+        @param directory: where to put the files of a search (in a temporary directory, removed when it ends); by
+                          default the system's temporary directory.
+        '''
+        if strategy not in ('breadth_first', 'ucs'):
+            raise Exception("External memory search is either 'breadth_first' or 'ucs', not {}".format(strategy))
+        self.strategy = strategy
+        self.ram_budget = ram_budget
+        self.directory = directory
+
+    def init_search(self, initState, goal_fn):
+        '''
+        Get ready to search. Call search on this object to run the search.
+
+        @param initState: the state of the puzzle to start the search from.
+        @param goal_fn: the goal function for the puzzle
+        '''
+        self.initial_state = initState
+        self.goal_fn = goal_fn
+        self.size = len(initState.pack())
+
+    def search(self, timebound=None, deadline=None):
+        '''
+        Searches from the initial state and returns the goal reached (with its path) and a SearchStats object, or False
+        and the SearchStats if there is no goal or the time bound runs out. Every search starts from scratch.
+
+        @param timebound: the maximum amount of time, in seconds, to spend on this search.
+        @param deadline: a Deadline to search within instead of timebound.
+        '''
+        self.deadline = deadline if deadline else Deadline(timebound)
+        self.search_start_time = self.deadline.clock()
+        self.states_expanded = 0
+        self.states_generated = 1  # initial state already generated
+        self.duplicates_pruned = 0
+        self.deadlock_pruned = 0
+        self.runs_spilled = 0
+        self.bytes_written = 0
+        self.max_bytes_buffered = 0
+
+        self.path = tempfile.mkdtemp(prefix='search-', dir=self.directory)
+        self.files = 0
+        self.buffers = dict()  # layer key -> bytearray of packed successors not yet spilled
+        self.counts = dict()  # layer key -> the number of successors added to the layer
+        self.runs = dict()  # layer key -> the paths of the runs spilled for the layer
+        self.buffered = 0
+        self.layers = []  # (key, path) of every layer expanded, in order
+        self.visited = None  # path of the sorted file of every state expanded
+        try:
+            self._add(self.initial_state.gval if self.strategy == 'ucs' else 0, self.initial_state.pack())
+            goal = self._search()
+        finally:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+        stats = SearchStats(self.states_expanded, self.states_generated, self.duplicates_pruned, 0,
+                            self.deadline.clock() - self.search_start_time, 0, self.deadlock_pruned,
+                            external_counters=(self.runs_spilled, self.bytes_written, self.max_bytes_buffered))
+        return goal or False, stats
+
+    def _search(self):
+        '''Expands the layers in order and returns the first goal state reached, with its path.'''
+        while self.counts:
+            key = min(self.counts)
+            layer = self._merge_layer(key)
+            for record in _read_run(layer, self.size):
+                state = self.initial_state.unpack(record, key if self.strategy == 'ucs' else 0)
+                if self.goal_fn(state):
+                    return self._path_to(record, key)
+                if self.deadline.expired():
+                    # exceeded time bound, must terminate search
+                    print("TRACE: Search has exceeeded the time bound provided.")
+                    return False
+
+                self.states_expanded = self.states_expanded + 1
+                successors = state.successors()
+                self.deadlock_pruned = self.deadlock_pruned + getattr(successors, 'pruned', 0)
+                for succ in successors:
+                    self.states_generated = self.states_generated + 1
+                    self._add(succ.gval if self.strategy == 'ucs' else key + 1, succ.pack())
+        return False
+
+    def _file(self, name):
+        self.files = self.files + 1
+        return os.path.join(self.path, '{}-{}'.format(name, self.files))
+
+    def _write(self, path, records):
+        '''Writes the records to the file at path and returns how many there were.'''
+        count = 0
+        with open(path, 'wb') as f:
+            for record in records:
+                f.write(record)
+                count = count + 1
+        self.bytes_written = self.bytes_written + count * self.size
+        return count
+
+    def _add(self, key, record):
+        '''Adds a packed successor to the layer with the given key, spilling a run if the buffers are over budget.'''
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            buffer = self.buffers[key] = bytearray()
+            self.counts.setdefault(key, 0)
+        buffer += record
+        self.counts[key] = self.counts[key] + 1
+        self.buffered = self.buffered + self.size
+        self.max_bytes_buffered = max(self.max_bytes_buffered, self.buffered)
+        if self.buffered > self.ram_budget:
+            self._spill(max(self.buffers, key=lambda k: len(self.buffers[k])))
+
+    def _sorted(self, key):
+        '''Removes the buffer of the layer with the given key and returns its records, sorted and without repeats.'''
+        buffer = self.buffers.pop(key, b'')
+        self.buffered = self.buffered - len(buffer)
+        size = self.size
+        return sorted(set(bytes(buffer[offset:offset + size]) for offset in range(0, len(buffer), size)))
+
+    def _spill(self, key):
+        '''Writes the buffer of the layer with the given key to disk as a sorted run.'''
+        path = self._file('run')
+        self._write(path, self._sorted(key))
+        self.runs.setdefault(key, []).append(path)
+        self.runs_spilled = self.runs_spilled + 1
+
+    def _merge_layer(self, key):
+        '''
+        Merges the runs (and the buffer) of the layer with the given key into the file of the layer, dropping repeats
+        and the states expanded before, adds the layer to the file of the states expanded and returns its path.
+        '''
+        runs = self.runs.pop(key, [])
+        sources = [_read_run(path, self.size) for path in runs] + [self._sorted(key)]
+        visited = _read_run(self.visited, self.size) if self.visited else ()
+        layer = self._file('layer')
+        count = self._write(layer, _subtract(_unique(heapq.merge(*sources)), visited))
+        self.duplicates_pruned = self.duplicates_pruned + self.counts.pop(key) - count
+        for path in runs:
+            os.remove(path)
+        self.layers.append((key, layer))
+
+        merged = self._file('visited')
+        self._write(merged, heapq.merge(*([_read_run(self.visited, self.size)] if self.visited else []),
+                                        _read_run(layer, self.size)))
+        if self.visited:
+            os.remove(self.visited)
+        self.visited = merged
+        return layer
+
+    def _path_to(self, record, key):
+        '''
+        Returns the state packed as record, in the layer with the given key, with its path from the initial state:
+        the earlier layers are scanned (latest first) for a state with it as a successor, and so on back to the initial
+        state, then the actions found are replayed.
+        '''
+        actions = []
+        index = len(self.layers) - 1
+        while index > 0:
+            found = None
+            for parent_index in range(index - 1, -1, -1):
+                parent_key, parent_layer = self.layers[parent_index]
+                if self.strategy == 'breadth_first' and parent_key != key - 1:
+                    continue
+                for parent_record in _read_run(parent_layer, self.size):
+                    parent = self.initial_state.unpack(parent_record, parent_key if self.strategy == 'ucs' else 0)
+                    for succ in parent.successors():
+                        if (self.strategy == 'breadth_first' or succ.gval == key) and succ.pack() == record:
+                            found = succ.action
+                            break
+                    if found is not None:
+                        break
+                if found is not None:
+                    break
+            if found is None:
+                raise Exception("No state expanded before has {} as a successor".format(record))
+            actions.append(found)
+            record, key, index = parent_record, parent_key, parent_index
+        actions.reverse()
+        return self.initial_state.replay(actions)
@@ -0,0 +1,127 @@
+'''Generation of Sokoban problems for scaling tests.
+
+   generate() builds a random, solvable Sokoban problem of any size: it
+   scatters obstacles (keeping the floor connected), puts every box on a
+   storage point and then plays the game backwards from that goal, with the
+   robots walking about and pulling boxes off storage. Every pull undoes a
+   push, so the problem can be solved by playing the same moves forwards.
+   The same arguments (seed included) always give the same problem.
+
+   scaling_problems() returns a sweep of such problems, from 8x8 up to
+   20x20 rooms with dozens of boxes, named for use with benchmark.run_suite().
+'''
+import random
+from collections import deque
+
+from sokoban import SokobanState, UP, RIGHT, DOWN, LEFT
+
+# (width, height, boxes, robots) of the problems in scaling_problems()
+SCALING_SIZES = ((8, 8, 4, 1), (10, 10, 6, 2), (12, 12, 8, 2), (15, 15, 12, 2), (20, 20, 16, 3), (20, 20, 32, 3))
+
+
+def generate(width, height, n_boxes, n_robots=1, obstacle_density=0.1, seed=0, pulls=None):
+    '''
+    Returns a solvable SokobanState with the given dimensions.
+    @param n_boxes: The number of boxes (and storage points).
+    @param n_robots: The number of robots.
+    @param obstacle_density: The fraction of the room's cells to make obstacles.
+    @param seed: The seed of the random choices.
+    @param pulls: How many times to pull a box while playing backwards (by default, 4 per box).
+    '''
+    rng = random.Random(seed)
+    cells = [(x, y) for y in range(height) for x in range(width)]
+    if n_boxes + n_robots > len(cells):
+        raise Exception("A {}x{} room cannot hold {} boxes and {} robots".format(width, height, n_boxes, n_robots))
+
+    obstacles = set()
+    for cell in rng.sample(cells, int(obstacle_density * len(cells))):
+        # only keep obstacles that leave the floor in one piece, and room for the boxes and the robots
+        if len(cells) - len(obstacles) - 1 < n_boxes + n_robots + 1:
+            break
+        obstacles.add(cell)
+        if not _connected(width, height, obstacles):
+            obstacles.remove(cell)
+
+    floor = [cell for cell in cells if cell not in obstacles]
+    storage = rng.sample(floor, n_boxes)
+    boxes = set(storage)
+    robots = rng.sample([cell for cell in floor if cell not in boxes], n_robots)
+
+    if pulls is None:
+        pulls = 4 * n_boxes
+    done = 0
+    while done < pulls or (boxes == set(storage) and n_boxes and done < 10 * pulls):
+        robot = rng.randrange(n_robots)
+        candidates = _pulls(width, height, obstacles, boxes, robots, robot)
+        if not candidates:
+            if not any(_pulls(width, height, obstacles, boxes, robots, other) for other in range(n_robots)):
+                break
+            continue
+        location, direction = rng.choice(candidates)
+        others = robots[:robot] + robots[robot + 1:]
+        # walk to location, then keep pulling the box in front of the robot back for a random number of steps
+        for _ in range(rng.randint(1, max(width, height) // 2)):
+            back = (location[0] - direction.delta[0], location[1] - direction.delta[1])
+            box = direction.move(location)
+            if box not in boxes or not _free(width, height, obstacles, boxes, others, back):
+                break
+            boxes.remove(box)
+            boxes.add(location)
+            location = back
+            done = done + 1
+        robots[robot] = location
+
+    return SokobanState("START", 0, None, width, height, tuple(robots), frozenset(boxes), frozenset(storage),
+                        frozenset(obstacles))
+
+
+def scaling_problems(seed=0, sizes=SCALING_SIZES, obstacle_density=0.1):
+    '''Returns (name, initial state) pairs of generated problems of each of the (width, height, boxes, robots) sizes.'''
+    return [('generated-{}x{}-{}b-{}r'.format(width, height, n_boxes, n_robots),
+             generate(width, height, n_boxes, n_robots, obstacle_density, seed))
+            for width, height, n_boxes, n_robots in sizes]
+
+
+def _free(width, height, obstacles, boxes, robots, location):
+    return 0 <= location[0] < width and 0 <= location[1] < height and location not in obstacles \
+        and location not in boxes and location not in robots
+
+
+def _pulls(width, height, obstacles, boxes, robots, robot):
+    '''Returns the (location, direction) pairs such that robot can walk to location and pull back the box at
+       location moved in direction, stepping away from it.'''
+    start = robots[robot]
+    others = robots[:robot] + robots[robot + 1:]
+    reached = {start}
+    frontier = deque([start])
+    pulls = []
+    while frontier:
+        location = frontier.popleft()
+        for direction in (UP, RIGHT, DOWN, LEFT):
+            new_location = direction.move(location)
+            if new_location in boxes:
+                back = (location[0] - direction.delta[0], location[1] - direction.delta[1])
+                if _free(width, height, obstacles, boxes, others, back):
+                    pulls.append((location, direction))
+            elif new_location not in reached and _free(width, height, obstacles, boxes, others, new_location):
+                reached.add(new_location)
+                frontier.append(new_location)
+    return pulls
+
+
+def _connected(width, height, obstacles):
+    '''Returns True if every cell that is not an obstacle can be reached from every other.'''
+    floor = [(x, y) for y in range(height) for x in range(width) if (x, y) not in obstacles]
+    if not floor:
+        return True
+    reached = {floor[0]}
+    frontier = deque([floor[0]])
+    while frontier:
+        location = frontier.popleft()
+        for direction in (UP, RIGHT, DOWN, LEFT):
+            new_location = direction.move(location)
+            if new_location not in reached and 0 <= new_location[0] < width and 0 <= new_location[1] < height \
+                    and new_location not in obstacles:
+                reached.add(new_location)
+                frontier.append(new_location)
+    return len(reached) == len(floor)
@@ -0,0 +1,289 @@
+'''Hash distributed A* (HDA*): A* spread over several worker processes.
+
+   Every state is owned by one worker, chosen by the hash of its
+   hashable_state(), and only its owner keeps it on OPEN and in its cycle
+   check dictionary. A worker expands the best node on its own OPEN and
+   sends each successor to the successor's owner, in batches (one
+   multiprocessing queue per worker), so the workers never share OPEN or
+   the dictionary and only exchange states. States travel packed (see
+   StateSpace.pack) with their gval and the hash and action of their
+   parent; the owner records the parent for the path and computes the hval.
+
+   A worker that expands a goal offers its cost as the incumbent, shared by
+   all the workers, which then only expand nodes with a smaller fval. The
+   first goal found is not necessarily the cheapest, so the search only ends
+   when every worker is idle (nothing on OPEN below the incumbent, and every
+   batch sent) and no batch is in flight. The coordinator detects that by
+   reading the per-worker counts of states sent and received twice: if
+   every worker was idle both times and the counts balanced and did not
+   change in between, no state can still arrive anywhere (the four counter
+   method). With an admissible heuristic the incumbent is then optimal.
+   The path is finally rebuilt by asking the owner of each state on it for
+   its parent, and replayed from the initial state.
+
+   Hashes are assigned to workers with Python's hash(), so states must hash
+   alike in every process: the workers are forked where possible, and
+   hashable_state() should be an integer (like a Sokoban Zobrist key) where
+   they are spawned.
+
+       engine = HDAStarEngine(workers=4)
+       engine.init_search(PROBLEMS[0], sokoban_goal_state, heur_matching)
+       final, stats = engine.search(timebound=60)
+'''
+import heapq
+import itertools
+import multiprocessing
+import os
+import queue
+import time
+
+from search import Deadline, SearchStats, _zero_hfn
+
+
+class HDAStarEngine:
+    def __init__(self, workers=None, batch_size=64, expansions_per_round=64):
+        '''
+        @param workers: the number of worker processes (by default, one per CPU).
+        @param batch_size: the most successors a worker buffers for another worker before sending them.
+        @param expansions_per_round: the most nodes a worker expands between looking for incoming states.
+        '''
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.expansions_per_round = expansions_per_round
+
+    def init_search(self, initState, goal_fn, heur_fn=_zero_hfn):
+        '''
+        Get ready to search. Call search on this object to run the search.
+
+        @param initState: the state of the puzzle to start the search from.
+        @param goal_fn: the goal function for the puzzle
+        @param heur_fn: the heuristic function to use
+        '''
+        self.initial_state = initState
+        self.goal_fn = goal_fn
+        self.heur_fn = heur_fn
+
+    def search(self, timebound=None, deadline=None):
+        '''
+        Searches from the initial state and returns the cheapest goal (with its path) and a SearchStats object, or
+        False and the SearchStats if there is no goal or the time bound runs out. The stats add up the counts of all
+        the workers, and hold the states explored, the states and batches sent and the communication time of each.
+        Raises an Exception if a worker process dies, after stopping the others.
+
+        @param timebound: the maximum amount of time, in seconds, to spend on this search.
+        @param deadline: a Deadline to search within instead of timebound.
+        '''
+        self.deadline = deadline if deadline else Deadline(timebound)
+        start = self.deadline.clock()
+        n = self.workers
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+        inboxes = [context.Queue() for _ in range(n)]
+        results = context.Queue()
+        incumbent = context.Value('d', float('inf'))
+        sent = context.Array('q', n, lock=False)
+        received = context.Array('q', n, lock=False)
+        idle = context.Array('b', n, lock=False)
+        stop = context.Event()
+        processes = [context.Process(target=_worker, args=(
+            index, n, self.initial_state, self.goal_fn, self.heur_fn, inboxes, results, incumbent, sent, received, idle,
+            stop, self.batch_size, self.expansions_per_round), daemon=True) for index in range(n)]
+        for process in processes:
+            process.start()
+
+        finished = False
+        try:
+            best = None  # (cost, hash) of the cheapest goal found
+            balanced = None  # the counts last seen with every worker idle
+            timed_out = False
+            while True:
+                try:
+                    message = results.get(timeout=0.001)
+                    if message[0] == 'goal' and (best is None or message[1] < best[0]):
+                        best = message[1:]
+                except queue.Empty:
+                    _check_workers(processes)
+                if self.deadline.expired():
+                    # exceeded time bound, must terminate search
+                    print("TRACE: Search has exceeeded the time bound provided.")
+                    timed_out = True
+                    break
+                counts = (tuple(sent), tuple(received))
+                if all(idle) and sum(counts[0]) == sum(counts[1]):
+                    if counts == balanced and all(idle):
+                        break
+                    balanced = counts
+                else:
+                    balanced = None
+            stop.set()
+
+            # the workers can all be idle before the message for the last goal found gets through, so goals are still
+            # taken in until every worker has reported, and then until the message for the incumbent arrives
+            counters = [None] * n
+            while None in counters or not timed_out and incumbent.value < (best[0] if best else float('inf')):
+                message = _receive(results, processes)
+                if message[0] == 'goal' and (best is None or message[1] < best[0]):
+                    best = message[1:]
+                elif message[0] == 'stats':
+                    counters[message[1]] = message[2:]
+
+            goal = False
+            if best is not None and not timed_out:
+                # ask the owner of each state on the path for its parent
+                actions = []
+                hash_state = best[1]
+                while True:
+                    inboxes[hash(hash_state) % n].put(('parent', hash_state))
+                    message = _receive(results, processes)
+                    if message[1] is None:
+                        break
+                    hash_state, action = message[1:]
+                    actions.append(action)
+                actions.reverse()
+                goal = self.initial_state.replay(actions)
+            finished = True
+        finally:
+            # the workers still searching (if a worker died) would take the message to finish for a batch
+            if finished:
+                for inbox in inboxes:
+                    inbox.put(None)
+            for process in processes:
+                if finished:
+                    process.join(1)
+                if process.is_alive():
+                    process.terminate()
+
+        expanded, generated, pruned, deadlocked, states_sent, batches_sent, communication_time = zip(*counters)
+        stats = SearchStats(sum(expanded), sum(generated), sum(pruned), 0, self.deadline.clock() - start, 0,
+                            sum(deadlocked),
+                            worker_counters=(list(expanded), list(states_sent), list(batches_sent),
+                                             list(communication_time)))
+        return goal, stats
+
+
+def _check_workers(processes):
+    '''Fails if a worker has exited: the workers only exit when told to, so it died.'''
+    for index, process in enumerate(processes):
+        if not process.is_alive():
+            raise Exception("HDA* worker {} died (exit code {})".format(index, process.exitcode))
+
+
+def _receive(results, processes, poll=0.1):
+    '''Returns the next message from the workers, failing instead of waiting forever if a worker has died.'''
+    while True:
+        try:
+            return results.get(timeout=poll)
+        except queue.Empty:
+            _check_workers(processes)
+
+
+def _worker(index, n, initial_state, goal_fn, heur_fn, inboxes, results, incumbent, sent, received, idle, stop,
+            batch_size, expansions_per_round):
+    '''The search loop of worker index (of n): A* over the states it owns, until stop is set.'''
+    inbox = inboxes[index]
+    open_list = []  # (fval, -gval, count, gval, state)
+    counter = itertools.count()
+    cc_dictionary = dict()  # hash -> gval of the cheapest path found to the state
+    parents = dict()  # hash -> (hash of the parent, action), or None for the initial state
+    outgoing = [[] for _ in range(n)]
+    expanded = generated = pruned = deadlocked = states_sent = batches_sent = 0
+    communication_time = 0.0
+
+    def reach(state, gval, parent):
+        '''Puts a state this worker owns on OPEN, unless it was reached before at no greater cost.'''
+        nonlocal pruned
+        hash_state = state.hashable_state()
+        if hash_state in cc_dictionary and gval >= cc_dictionary[hash_state]:
+            pruned = pruned + 1
+            return
+        cc_dictionary[hash_state] = gval
+        parents[hash_state] = parent
+        heapq.heappush(open_list, (gval + heur_fn(state), -gval, next(counter), gval, state))
+
+    def send(owner):
+        nonlocal states_sent, batches_sent, communication_time
+        batch = outgoing[owner]
+        outgoing[owner] = []
+        sent[index] = sent[index] + len(batch)
+        states_sent = states_sent + len(batch)
+        batches_sent = batches_sent + 1
+        start = time.perf_counter()
+        inboxes[owner].put(batch)
+        communication_time = communication_time + time.perf_counter() - start
+
+    if hash(initial_state.hashable_state()) % n == index:
+        reach(initial_state, initial_state.gval, None)
+
+    while not stop.is_set():
+        # take in the states sent to this worker
+        start = time.perf_counter()
+        while True:
+            try:
+                batch = inbox.get_nowait()
+            except queue.Empty:
+                break
+            idle[index] = 0
+            received[index] = received[index] + len(batch)
+            for data, gval, parent_hash, action in batch:
+                reach(initial_state.unpack(data, gval), gval, (parent_hash, action))
+        communication_time = communication_time + time.perf_counter() - start
+
+        for _ in range(expansions_per_round):
+            if not open_list or open_list[0][0] >= incumbent.value:
+                break
+            _, _, _, gval, state = heapq.heappop(open_list)
+            hash_state = state.hashable_state()
+            if cc_dictionary[hash_state] < gval:
+                continue
+            if goal_fn(state):
+                with incumbent.get_lock():
+                    if gval < incumbent.value:
+                        incumbent.value = gval
+                        results.put(('goal', gval, hash_state))
+                continue
+
+            expanded = expanded + 1
+            successors = state.successors()
+            deadlocked = deadlocked + getattr(successors, 'pruned', 0)
+            for succ in successors:
+                generated = generated + 1
+                owner = hash(succ.hashable_state()) % n
+                if owner == index:
+                    reach(succ, succ.gval, (hash_state, succ.action))
+                    # the owner keeps the parent's hash instead of the parent
+                    succ.parent = None
+                    continue
+                outgoing[owner].append((succ.pack(), succ.gval, hash_state, succ.action))
+                if len(outgoing[owner]) >= batch_size:
+                    send(owner)
+
+        if open_list and open_list[0][0] < incumbent.value:
+            continue
+        # nothing left to expand below the incumbent: send every successor waiting, then wait for more states
+        for owner in range(n):
+            if outgoing[owner]:
+                send(owner)
+        idle[index] = 1
+        start = time.perf_counter()
+        try:
+            batch = inbox.get(timeout=0.01)
+        except queue.Empty:
+            batch = None
+        communication_time = communication_time + time.perf_counter() - start
+        if batch:
+            idle[index] = 0
+            received[index] = received[index] + len(batch)
+            for data, gval, parent_hash, action in batch:
+                reach(initial_state.unpack(data, gval), gval, (parent_hash, action))
+
+    results.put(('stats', index, expanded, generated, pruned, deadlocked, states_sent, batches_sent,
+                 communication_time))
+    # answer the requests for the path, until told to finish
+    while True:
+        message = inbox.get()
+        if message is None:
+            break
+        if isinstance(message, tuple) and message[0] == 'parent':
+            results.put(('parent',) + (parents.get(message[1]) or (None,)))
+    # batches sent after the search stopped are never read, so do not wait to flush them on exit
+    for other in inboxes:
+        other.cancel_join_thread()
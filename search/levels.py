@@ -0,0 +1,147 @@
+'''Reading Sokoban levels from text files and writing solutions.
+
+   read_levels() parses the common XSB text format, one level after another
+   as the lines come in:
+
+       #    wall                $    box
+       .    storage point       *    box on a storage point
+       @    robot               +    robot on a storage point
+       space, - or _    floor
+
+   Several robots make a multi-robot level; they are numbered in reading
+   order. Levels are separated by any line that is not part of a level: a
+   blank line, a comment (starting with ';', which names the level after it)
+   or a "Title:" line (which names the level before it). Cells outside the
+   walls become obstacles of the smallest room holding the level. Levels
+   with the same layout share one SokobanMap.
+
+   lurd() writes the moves on a solution's path in LURD notation.
+'''
+from collections import deque
+
+from sokoban import SokobanMap, SokobanState, UP, RIGHT, DOWN, LEFT
+
+_LEVEL_CHARACTERS = frozenset('#@+$*.-_ ')
+_LURD = {'up': 'u', 'right': 'r', 'down': 'd', 'left': 'l'}
+
+
+def read_levels(lines, prefix='level'):
+    '''
+    Generates a (name, initial state) pair for every level in lines, any iterable of strings such as an open file.
+    @param prefix: The name of a level without a name is prefix-n, for the n-th level.
+    '''
+    maps = dict()  # layout -> the SokobanMap of the levels read so far that have it
+    rows = []
+    comment = None
+    pending = None  # [name, rows] of the last level read, until the lines after it are read for its title
+    count = 0
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if '#' in line and _LEVEL_CHARACTERS.issuperset(line):
+            if pending:
+                yield pending[0], _build(pending[0], pending[1], maps)
+                pending = None
+            rows.append(line)
+            continue
+
+        if rows:
+            count = count + 1
+            pending = [comment or '{}-{}'.format(prefix, count), rows]
+            rows = []
+            comment = None
+        line = line.strip()
+        if line[:6].lower() == 'title:' and pending:
+            pending[0] = line[6:].strip()
+        elif line.startswith(';') and line[1:].strip():
+            comment = line[1:].strip()
+
+    if rows:
+        count = count + 1
+        pending = [comment or '{}-{}'.format(prefix, count), rows]
+    if pending:
+        yield pending[0], _build(pending[0], pending[1], maps)
+
+
+def load_levels(path):
+    '''Generates a (name, initial state) pair for every level in the file at path (see read_levels).'''
+    prefix = path.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+    with open(path) as f:
+        yield from read_levels(f, prefix)
+
+
+def _build(name, rows, maps):
+    '''Returns the initial state of the level drawn by rows.'''
+    walls = set()
+    boxes = set()
+    storage = set()
+    robots = []
+    for y, row in enumerate(rows):
+        for x, character in enumerate(row):
+            if character == '#':
+                walls.add((x, y))
+            elif character in '$*':
+                boxes.add((x, y))
+            if character in '.*+':
+                storage.add((x, y))
+            if character in '@+':
+                robots.append((x, y))
+    if not robots:
+        raise Exception("Level {} has no robot".format(name))
+
+    # the floor is what the robots could walk over if the boxes were not there
+    floor = set(robots)
+    frontier = deque(robots)
+    while frontier:
+        location = frontier.popleft()
+        for direction in (UP, RIGHT, DOWN, LEFT):
+            new_location = direction.move(location)
+            if new_location in floor or new_location in walls:
+                continue
+            if not (0 <= new_location[1] < len(rows) and 0 <= new_location[0] < len(rows[new_location[1]])):
+                raise Exception("Level {} is not enclosed by walls".format(name))
+            floor.add(new_location)
+            frontier.append(new_location)
+    floor |= boxes | storage
+
+    min_x = min(x for x, _ in floor)
+    min_y = min(y for _, y in floor)
+    width = max(x for x, _ in floor) - min_x + 1
+    height = max(y for _, y in floor) - min_y + 1
+    shift = lambda cells: frozenset((x - min_x, y - min_y) for x, y in cells)
+    storage = shift(storage)
+    obstacles = frozenset((x, y) for y in range(height) for x in range(width)
+                          if (x + min_x, y + min_y) not in floor)
+
+    static_map = maps.get((width, height, storage, obstacles))
+    if static_map is None:
+        static_map = maps[(width, height, storage, obstacles)] = SokobanMap(width, height, storage, obstacles)
+    return SokobanState.from_map("START", 0, None, static_map, tuple((x - min_x, y - min_y) for x, y in robots),
+                                 shift(boxes))
+
+
+def lurd(state):
+    '''
+    Returns the moves on the path to state in LURD notation: l, u, r or d for each step, in upper case if it pushes a
+    box. If the level has several robots, every move is preceded by the number of the robot making it whenever that
+    robot changes, in brackets (e.g., "[0]rrU[1]ld").
+    '''
+    if hasattr(state, 'step_path'):
+        # push-level states name several steps per action
+        state = state.step_path()
+    path = []
+    s = state
+    while s.parent:
+        path.append(s)
+        s = s.parent
+    several = len(state.robots) > 1
+
+    moves = []
+    robot = None
+    for s in reversed(path):
+        number, direction = s.action.split(" ")
+        if several and number != robot:
+            moves.append('[{}]'.format(number))
+            robot = number
+        move = _LURD[direction]
+        moves.append(move.upper() if s.boxes != s.parent.boxes else move)
+    return ''.join(moves)
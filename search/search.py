@@ -38,13 +38,17 @@
 
     '''
 import heapq
-from collections import deque
+import itertools
 import os
+import pickle
+import time
+from array import array
+from collections import deque, OrderedDict
 
 
 class StateSpace:
     '''Abstract class for defining State spaces for search routines'''
-    n = 0
+    __slots__ = ('action', 'gval', 'parent', 'index')
 
     def __init__(self, action, gval, parent):
         '''Problem specific state space objects must always include the data items
@@ -59,15 +63,68 @@ class StateSpace:
         self.action = action
         self.gval = gval
         self.parent = parent
-        self.index = StateSpace.n
-        StateSpace.n = StateSpace.n + 1
+        self.index = 0  # numbered by the SearchEngine that generates the state
+
+    def __getstate__(self):
+        '''States are pickled without their parent, so sending a state to
+           another process does not drag the whole path along with it. Use
+           path_actions() first if the path is needed on the other side.'''
+        state = dict(getattr(self, '__dict__', {}))
+        for slot, descriptor in self._slot_descriptors():
+            if slot != 'parent':
+                try:
+                    state[slot] = descriptor.__get__(self)
+                except AttributeError:  # slot never assigned
+                    pass
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        self.parent = None
+        # slots are set through their descriptors, as subclasses may shadow them with properties
+        for slot, descriptor in self._slot_descriptors():
+            if slot in state:
+                descriptor.__set__(self, state.pop(slot))
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def _slot_descriptors(self):
+        for cls in type(self).__mro__:
+            for slot in cls.__dict__.get('__slots__', ()):
+                yield slot, cls.__dict__[slot]
 
     def successors(self):
         '''This method when invoked on a state space object must return a
            list of successor states, each with the data items "action"
            the action used to generate this successor state, "gval" the
            gval of self plus the cost of the action, and parent set to self.
-           Also any problem specific data must be specified property.'''
+           Also any problem specific data must be specified property.
+           Problems that discard successors themselves (e.g., deadlocked
+           ones) can return a Successors list recording how many they
+           pruned.'''
+        raise Exception("Must be overridden in subclass.")
+
+    def predecessors(self):
+        '''This method is only needed by the bidirectional strategy, which
+           searches backwards from the goal states. It must return a list
+           of the states from which one action leads to self, each with
+           the data items "action" the action that leads from the
+           predecessor to self, "gval" the gval of self plus the cost of
+           the action, and parent set to self.'''
+        raise Exception("Must be overridden in subclass.")
+
+    def pack(self):
+        '''This method is only needed by external memory search (see
+           external.py). It must return the state (but not its action, gval
+           or parent) as bytes, the same number of bytes for every state of
+           a problem, such that two states pack to equal bytes if and only
+           if they represent the same problem state.'''
+        raise Exception("Must be overridden in subclass.")
+
+    def unpack(self, data, gval=0):
+        '''The inverse of pack(), for external memory search. It must return
+           the state of the same problem as self that packs to data, with
+           the given gval and without a parent.'''
         raise Exception("Must be overridden in subclass.")
 
     def hashable_state(self):
@@ -96,6 +153,30 @@ class StateSpace:
             states.pop().print_state()
         print("")
 
+    def path_actions(self):
+        '''Returns the list of actions used to reach self from the initial state'''
+        actions = []
+        s = self
+        while s.parent:
+            actions.append(s.action)
+            s = s.parent
+        actions.reverse()
+        return actions
+
+    def replay(self, actions):
+        '''Returns the state reached by applying the named actions in order,
+           starting from self, with its parent chain. Each action must name
+           one of the successors of the state it is applied to.'''
+        s = self
+        for action in actions:
+            for succ in s.successors():
+                if succ.action == action:
+                    s = succ
+                    break
+            else:
+                raise Exception("Action {} does not apply to the state reached so far".format(action))
+        return s
+
     def draw_path(self):
         '''print the sequence of actions used to reach self'''
         s = self
@@ -125,10 +206,14 @@ _BEST_FIRST = 2
 _ASTAR = 3
 _UCS = 4
 _CUSTOM = 5
-
-# For best first and astar we use a priority queue. This requires
-# a comparison function for nodes. These constants indicate if we use
-# the gval, the hval or the sum of gval and hval in the comparison.
+_BIDIRECTIONAL = 6
+_IDA_STAR = 7
+_SMA_STAR = 8
+
+# For best first and astar we use a priority queue. Nodes are pushed as
+# (fval, tie break, insertion count, node) tuples whose key is computed
+# once when the node is inserted. These constants indicate if the fval is the
+# gval, the hval, the sum of gval and hval or the custom fval_function.
 _SUM_HG = 0
 _H = 1
 _G = 2
@@ -154,17 +239,235 @@ def _fval_function(state):
     return state.hval
 
 
+class Successors(list):
+    '''A list of successor states that also records how many candidate
+       successors the problem refused to generate itself (e.g., because
+       they are deadlocked), so the search engine can report them.'''
+    __slots__ = ('pruned',)
+
+    def __init__(self, *args):
+        list.__init__(self, *args)
+        self.pruned = 0
+
+
 class SearchStats:
 
-    def __init__(self, n1, n2, n3, n4, n5):
+    def __init__(self, n1, n2, n3, n4, n5, n6=0, n7=0, cache_counters=(0, 0, 0), backward_counters=(0, 0, 0),
+                 bounded_counters=(0, 0, 0), external_counters=(0, 0, 0), worker_counters=((), (), (), ())):
         self.states_expanded = n1
         self.states_generated = n2
         self.states_pruned_cycles = n3
         self.states_pruned_cost = n4
         self.total_time = n5
+        self.duplicates_avoided = n6
+        self.states_pruned_deadlock = n7
+        self.heuristic_cache_hits, self.heuristic_cache_misses, self.heuristic_cache_evictions = cache_counters
+        # the part of the search done backwards from the goal states by the bidirectional strategy
+        self.backward_states_expanded, self.backward_states_generated, self.frontier_meets = backward_counters
+        # the memory bounded strategies: iterations (ida_star), states expanded again and the most nodes held at once
+        self.iterations, self.states_reexpanded, self.max_nodes_stored = bounded_counters
+        # external memory search: sorted runs spilled to disk, bytes written to disk and the most bytes buffered at once
+        self.runs_spilled, self.bytes_written, self.max_bytes_buffered = external_counters
+        # parallel search: per worker, the states explored, the states and the batches sent to other workers and the
+        # seconds spent sending and receiving
+        self.worker_states_expanded, self.worker_states_sent, self.worker_batches_sent, \
+            self.worker_communication_time = worker_counters
+
+    def __str__(self):
+        return f'states generated: {self.states_generated}\nstates explored: {self.states_expanded}\nstate pruned by cycle checking: {self.states_pruned_cycles}\nstates pruned by cost checking: {self.states_pruned_cost}\nstates pruned by deadlock detection: {self.states_pruned_deadlock}\nduplicate frontier entries avoided: {self.duplicates_avoided}\nheuristic cache hits/misses/evictions: {self.heuristic_cache_hits}/{self.heuristic_cache_misses}/{self.heuristic_cache_evictions}\nbackward states generated/explored, frontier meets: {self.backward_states_generated}/{self.backward_states_expanded}/{self.frontier_meets}\niterations: {self.iterations}\nstates re-expanded: {self.states_reexpanded}\nmost nodes stored at once: {self.max_nodes_stored}\nruns spilled/bytes written/most bytes buffered: {self.runs_spilled}/{self.bytes_written}/{self.max_bytes_buffered}\nstates explored/sent/batches sent/communication time per worker: {list(zip(self.worker_states_expanded, self.worker_states_sent, self.worker_batches_sent, self.worker_communication_time))}\ntotal search time: {self.total_time}\n'
+
+
+class Deadline:
+    '''The time budget of a search, which can be shared by several searches
+       (e.g., the iterations of an anytime search) so that together they
+       stay within it. Time is measured on the monotonic wall clock, or on
+       the CPU time of the process if cpu is True.
+
+       expired() is meant to be called once per expansion. It only reads the
+       clock every interval calls, adapting interval to the time the calls
+       between two readings took so that the clock is read about every
+       check_period seconds, and at once when calls get slower (e.g., when
+       single expansions are expensive).'''
+
+    def __init__(self, timebound=None, cpu=False, check_period=0.001):
+        '''@param timebound: the budget in seconds, starting now (None, or 0, for no limit).'''
+        self.clock = time.process_time if cpu else time.monotonic
+        self.start = self.clock()
+        self.stop = self.start + timebound if timebound else None
+        self.check_period = check_period
+        self.interval = 1
+        self.countdown = 1
+        self.last_check = self.start
+
+    def expired(self):
+        '''Returns True once the budget is used up'''
+        if self.stop is None:
+            return False
+        self.countdown = self.countdown - 1
+        if self.countdown > 0:
+            return False
+        now = self.clock()
+        if now >= self.stop:
+            self.countdown = 1
+            return True
+        per_call = (now - self.last_check) / self.interval
+        self.last_check = now
+        interval = int(min(self.check_period, self.stop - now) / per_call) if per_call > 0 else 2 * self.interval
+        # shrink at once, but grow at most twofold per reading
+        self.interval = max(1, min(interval, 2 * self.interval))
+        self.countdown = self.interval
+        return False
+
+    def remaining(self):
+        '''The seconds left in the budget (infinite if there is no limit)'''
+        if self.stop is None:
+            return float('inf')
+        return max(self.stop - self.clock(), 0)
+
+    def elapsed(self):
+        return self.clock() - self.start
+
+
+class SearchEvent:
+    '''What the listeners of a SearchEngine are called with (see
+       SearchEngine.add_listener). kind is one of
+         'start'     a search is starting,
+         'progress'  the listener's number of further states has been explored,
+         'incumbent' a cheaper solution, of cost cost, was found during an
+                     anytime or bidirectional search (state is the solution
+                     for anytime search, None for a meet of bidirectional search),
+         'finish'    the search is over (state is the solution, or None).
+       rate is the number of states explored per second since the previous event.'''
+
+    __slots__ = ('kind', 'elapsed', 'states_expanded', 'states_generated', 'frontier_size', 'dictionary_size', 'rate',
+                 'state', 'cost')
+
+    def __init__(self, kind, elapsed, states_expanded, states_generated, frontier_size, dictionary_size, rate,
+                 state=None, cost=None):
+        self.kind = kind
+        self.elapsed = elapsed
+        self.states_expanded = states_expanded
+        self.states_generated = states_generated
+        self.frontier_size = frontier_size
+        self.dictionary_size = dictionary_size
+        self.rate = rate
+        self.state = state
+        self.cost = cost
 
     def __str__(self):
-        return f'states generated: {self.states_generated}\nstates explored: {self.states_expanded}\nstate pruned by cycle checking: {self.states_pruned_cycles}\nstates pruned by cost checking: {self.states_pruned_cost}\ntotal search time: {self.total_time}\n'
+        return f'{self.kind} after {self.elapsed:.3f}s: {self.states_expanded} states explored ({self.rate:.0f}/s), {self.states_generated} generated, frontier {self.frontier_size}, dictionary {self.dictionary_size}' + (
+            '' if self.cost is None else f', cost {self.cost}')
+
+
+class CachedHeuristic:
+    '''Wraps a heuristic function with a bounded LRU cache. key_fn maps a
+       state to the (hashable) part of it the heuristic depends on, e.g.,
+       the boxes of a Sokoban state, so states sharing a key are evaluated
+       once. At most max_entries values are kept; the least recently used
+       one is evicted when the cache is full, which caps its memory at
+       roughly max_entries times the size of a key. Pass an instance as
+       heur_fn to the search engine and the hits, misses and evictions of
+       the engine's own lookups appear in the SearchStats: the engine
+       searches with a view of the cache (see view), so engines sharing an
+       instance, even at the same time, do not count each other's.'''
+
+    def __init__(self, heur_fn, key_fn, max_entries=100000):
+        self.heur_fn = heur_fn
+        self.key_fn = key_fn
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__name__ = getattr(heur_fn, '__name__', 'heuristic') + '_cached'
+
+    def __call__(self, state):
+        key = self.key_fn(state)
+        cache = self.cache
+        value = cache.get(key)
+        if value is not None:
+            self.hits = self.hits + 1
+            try:
+                cache.move_to_end(key)
+            except KeyError:  # evicted meanwhile by a search in another thread
+                pass
+            return value
+        self.misses = self.misses + 1
+        value = cache[key] = self.heur_fn(state)
+        if len(cache) > self.max_entries:
+            cache.popitem(last=False)
+            self.evictions = self.evictions + 1
+        return value
+
+    def cache_counters(self):
+        return self.hits, self.misses, self.evictions
+
+    def view(self):
+        '''Returns a CachedHeuristic sharing this one's cache, but with hit, miss and eviction counts of its own.'''
+        view = CachedHeuristic(self.heur_fn, self.key_fn, self.max_entries)
+        view.cache = self.cache
+        view.__name__ = self.__name__
+        return view
+
+    def clear(self):
+        self.cache.clear()
+
+
+class StateStore:
+    '''The cycle check dictionary of a compact search (see SearchEngine).
+       Every distinct state reached is interned under a dense integer ID,
+       and its gval, the ID of its parent and the action reaching it from
+       the parent are kept in arrays indexed by ID (actions are interned as
+       well), so a state costs one dictionary entry and a few array slots
+       instead of a state object kept alive through the parent chains. It
+       reads like the plain dictionary: store[hash_state] is the gval of the
+       cheapest path found to the state.'''
+
+    def __init__(self):
+        self.ids = dict()  # hashable_state -> ID
+        self.gvals = array('d')
+        self.parents = array('q')  # -1 for the initial state
+        self.actions = array('I')
+        self.action_ids = dict()
+        self.action_names = []
+
+    def __len__(self):
+        return len(self.gvals)
+
+    def __contains__(self, hash_state):
+        return hash_state in self.ids
+
+    def __getitem__(self, hash_state):
+        return self.gvals[self.ids[hash_state]]
+
+    def add(self, hash_state, gval, parent_id, action):
+        '''Records a path of cost gval to the state through the state with ID parent_id (-1 if it is the initial
+           state) and action, replacing any path recorded before. Returns the ID of the state.'''
+        action_id = self.action_ids.get(action)
+        if action_id is None:
+            action_id = self.action_ids[action] = len(self.action_names)
+            self.action_names.append(action)
+        state_id = self.ids.get(hash_state)
+        if state_id is None:
+            state_id = self.ids[hash_state] = len(self.gvals)
+            self.gvals.append(gval)
+            self.parents.append(parent_id)
+            self.actions.append(action_id)
+        else:
+            self.gvals[state_id] = gval
+            self.parents[state_id] = parent_id
+            self.actions[state_id] = action_id
+        return state_id
+
+    def path_actions(self, hash_state):
+        '''Returns the list of actions on the path recorded to the state from the initial state'''
+        actions = []
+        state_id = self.ids[hash_state]
+        while self.parents[state_id] >= 0:
+            actions.append(self.action_names[self.actions[state_id]])
+            state_id = self.parents[state_id]
+        actions.reverse()
+        return actions
 
 
 class sNode:
@@ -172,48 +475,96 @@ class sNode:
     node consists of a search space object (determined by the problem
     definition) along with the h and g values (the g values is
     redundant as it is stored in the state, but we make a copy in the
-    node object for convenience), and the number of the node'''
+    node object for convenience). The fval_function is applied once
+    when the node is inserted into OPEN (see Open), so it is accepted
+    for compatibility but not stored.'''
 
-    n = 0
-    lt_type = _SUM_HG
+    __slots__ = ('state', 'hval', 'gval')
 
-    def __init__(self, state, hval, fval_function):
+    def __init__(self, state, hval, fval_function=None):
         self.state = state
         self.hval = hval
         self.gval = state.gval
-        self.index = sNode.n
-        self.fval_function = fval_function
-        sNode.n = sNode.n + 1
-
-    def __lt__(self, other):
-        '''For astar and best first we use a priority queue for the
-           OPEN set. This queue stores search nodes waiting to be
-           expanded. Thus we need to define a node1 < node2 function
-           by defining the __lt__ function. Dependent on the type of
-           search this comparison function compares the h-value, the
-           g-value or the f-value of the nodes. Note for the f-value
-           we wish to break ties by letting node1 < node2 if they both
-           have identical f-values but if node1 has a GREATER g
-           value. This means that we expand nodes along deeper paths
-           first causing the search to proceed directly to the goal'''
-
-        if sNode.lt_type == _SUM_HG:
-            if (self.gval + self.hval) == (other.gval + other.hval):
-                # break ties by greatest gval.
-                return self.gval > other.gval
-            else:
-                return ((self.gval + self.hval) < (other.gval + other.hval))
-        if sNode.lt_type == _G:
-            return self.gval < other.gval
-        if sNode.lt_type == _H:
-            return self.hval < other.hval
-        if sNode.lt_type == _C:
-            return self.fval_function(self) < other.fval_function(other)
 
-        print('sNode class has invalid comparator setting!')
 
-        # return default of lowest gval (generating UCS behavior)
-        return self.gval < other.gval
+class IndexedHeap:
+    '''Binary heap of OPEN entries that supports decrease-key. Entries are
+       (fval, tie break, count, node) tuples indexed by the hashable_state()
+       of the node's state, so each state has at most one live entry on
+       the heap. Inserting an entry for a state that is already on the
+       heap either replaces the old entry (if the new node reaches the
+       state via a cheaper path) or is dropped; either way a duplicate
+       frontier entry has been avoided.'''
+
+    def __init__(self):
+        self.heap = []
+        self.position = dict()  # hashable_state -> index into self.heap
+        self.duplicates_avoided = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __iter__(self):
+        return iter(self.heap)
+
+    def push(self, entry):
+        hash_state = entry[-1].state.hashable_state()
+        pos = self.position.get(hash_state)
+        if pos is None:
+            self.heap.append(entry)
+            self._sift_up(len(self.heap) - 1)
+            return
+        self.duplicates_avoided = self.duplicates_avoided + 1
+        if entry[-1].gval < self.heap[pos][-1].gval:
+            # cheaper path to a state already on the frontier: decrease-key
+            self.heap[pos] = entry
+            self._sift_up(pos)
+            self._sift_down(self.position[hash_state])
+
+    def pop(self):
+        heap = self.heap
+        last = heap.pop()
+        if heap:
+            entry = heap[0]
+            heap[0] = last
+            self._sift_down(0)
+        else:
+            entry = last
+        del self.position[entry[-1].state.hashable_state()]
+        return entry
+
+    def _sift_up(self, pos):
+        heap = self.heap
+        entry = heap[pos]
+        while pos > 0:
+            parentpos = (pos - 1) >> 1
+            parent = heap[parentpos]
+            if not entry < parent:
+                break
+            heap[pos] = parent
+            self.position[parent[-1].state.hashable_state()] = pos
+            pos = parentpos
+        heap[pos] = entry
+        self.position[entry[-1].state.hashable_state()] = pos
+
+    def _sift_down(self, pos):
+        heap = self.heap
+        endpos = len(heap)
+        entry = heap[pos]
+        childpos = 2 * pos + 1
+        while childpos < endpos:
+            rightpos = childpos + 1
+            if rightpos < endpos and heap[rightpos] < heap[childpos]:
+                childpos = rightpos
+            child = heap[childpos]
+            if not child < entry:
+                break
+            heap[pos] = child
+            self.position[child[-1].state.hashable_state()] = pos
+            pos = childpos
+            childpos = 2 * pos + 1
+        heap[pos] = entry
+        self.position[entry[-1].state.hashable_state()] = pos
 
 
 class Open:
@@ -223,74 +574,259 @@ class Open:
        functions to operate as needed by the particular search
        strategy'''
 
-    def __init__(self, search_strategy):
-        if search_strategy == _DEPTH_FIRST:
+    def __init__(self, search_strategy, decrease_key=False, fval_function=_fval_function):
+        self.indexed = decrease_key and search_strategy in (_UCS, _BEST_FIRST, _ASTAR, _CUSTOM, _BIDIRECTIONAL)
+        self.fval_function = fval_function
+        self.keyed = False
+        if search_strategy in (_DEPTH_FIRST, _IDA_STAR, _SMA_STAR):
             # use stack for OPEN set (last in---most recent successor added---is first out)
+            # (ida_star and sma_star keep their own frontier, OPEN only holds the initial node for them)
             self.open = []
             self.insert = self.open.append
             self.extract = self.open.pop
+            self.putback = self.open.append
         elif search_strategy == _BREADTH_FIRST:
             # use queue for OPEN (first in---earliest node not yet expanded---is first out)
             self.open = deque()
             self.insert = self.open.append
             self.extract = self.open.popleft
+            self.putback = self.open.appendleft
         elif search_strategy == _UCS:
             # use priority queue for OPEN (first out is node with lowest gval)
-            self.open = []
-            # set node less than function to compare gvals only
-            sNode.lt_type = _G
-            self.insert = lambda node: heapq.heappush(self.open, node)
-            self.extract = lambda: heapq.heappop(self.open)
+            self._use_heap(_G)
         elif search_strategy == _BEST_FIRST:
             # use priority queue for OPEN (first out is node with lowest hval)
-            self.open = []
-            # set node less than function to compare hvals only
-            sNode.lt_type = _H
-            self.insert = lambda node: heapq.heappush(self.open, node)
-            self.extract = lambda: heapq.heappop(self.open)
-        elif search_strategy == _ASTAR:
+            self._use_heap(_H)
+        elif search_strategy in (_ASTAR, _BIDIRECTIONAL):
             # use priority queue for OPEN (first out is node with lowest fval = gval+hval)
-            self.open = []
-            # set node less than function to compare sums of hval and gval
-            sNode.lt_type = _SUM_HG
-            self.insert = lambda node: heapq.heappush(self.open, node)
-            self.extract = lambda: heapq.heappop(self.open)
+            # (bidirectional search keeps one such OPEN for each direction)
+            self._use_heap(_SUM_HG)
         elif search_strategy == _CUSTOM:
-            # use priority queue for OPEN (first out is node with lowest fval)
+            # use priority queue for OPEN (first out is node with lowest fval = fval_function(node))
+            self._use_heap(_C)
+
+    def _use_heap(self, lt_type):
+        '''Entries are (fval, tie break, count, node) tuples. For astar and
+           custom, ties on the fval are broken in favour of the GREATER
+           gval (expanding nodes along deeper paths first makes the search
+           proceed directly to the goal); remaining ties, and all ties for
+           ucs and best first, are broken in insertion order. The key is
+           computed once here, so heap operations only compare tuples.'''
+        if lt_type == _SUM_HG:
+            key = lambda node: (node.gval + node.hval, -node.gval)
+        elif lt_type == _G:
+            key = lambda node: (node.gval, 0)
+        elif lt_type == _H:
+            key = lambda node: (node.hval, 0)
+        else:
+            fval_function = self.fval_function
+            key = lambda node: (fval_function(node), -node.gval)
+        counter = itertools.count()
+        self.keyed = True
+
+        if self.indexed:
+            # one live entry per state, cheaper paths decrease the key in place
+            self.open = IndexedHeap()
+            push = self.open.push
+            pop = self.open.pop
+        else:
+            # duplicates are pushed and stale entries skipped lazily on extraction
             self.open = []
-            # set node less than function to compare sums of fval
-            sNode.lt_type = _C
-            self.insert = lambda node: heapq.heappush(self.open, node)
-            self.extract = lambda: heapq.heappop(self.open)
+            push = lambda entry: heapq.heappush(self.open, entry)
+            pop = lambda: heapq.heappop(self.open)
+
+        def extract():
+            self.last_entry = pop()
+            return self.last_entry[-1]
+
+        self.insert = lambda node: push(key(node) + (next(counter), node))
+        self.extract = extract
+        # the entry keeps its insertion count, so the node goes back ahead of the nodes it tied with
+        self.putback = lambda node: push(self.last_entry)
 
     def empty(self):
         return not self.open
 
+    def __len__(self):
+        return len(self.open)
+
+    def nodes(self, ordered=False):
+        '''The nodes currently on OPEN, in no particular order, or if ordered
+           is True in the order they were inserted (stack and queue OPENs
+           are always in that order)'''
+        if self.keyed:
+            entries = sorted(self.open, key=lambda entry: entry[-2]) if ordered else self.open
+            return [entry[-1] for entry in entries]
+        return list(self.open)
+
+    def duplicates_avoided(self):
+        return self.open.duplicates_avoided if self.indexed else 0
+
+    def min_fval(self):
+        '''The smallest fval on a non-empty priority queue OPEN. A stale
+           entry can only overestimate the fval of its state, so this is a
+           lower bound on the fval of every node still to be expanded.'''
+        return (self.open.heap if self.indexed else self.open)[0][0]
+
     def print_open(self):
         print("{", end="")
-        if len(self.open) == 1:
-            print("   <S{}:{}:{}, g={}, h={}, f=g+h={}>".format(self.open[0].state.index, self.open[0].state.action,
-                                                                self.open[0].state.hashable_state(), self.open[0].gval,
-                                                                self.open[0].hval,
-                                                                self.open[0].gval + self.open[0].hval), end="")
-        else:
-            for nd in self.open:
-                print("   <S{}:{}:{}, g={}, h={}, f=g+h={}>".format(nd.state.index, nd.state.action,
-                                                                    nd.state.hashable_state(), nd.gval, nd.hval,
-                                                                    nd.gval + nd.hval), end="")
+        for nd in self.nodes():
+            print("   <S{}:{}:{}, g={}, h={}, f=g+h={}>".format(nd.state.index, nd.state.action,
+                                                                nd.state.hashable_state(), nd.gval, nd.hval,
+                                                                nd.gval + nd.hval), end="")
         print("}")
 
 
+class _Path:
+    '''The states on the path from the initial state to the node being
+       expanded, with a set of their hashes, so depth first strategies can
+       path check a successor in O(1) instead of walking its parent chain.
+       A node taken from a stack always extends a prefix of the path to the
+       node expanded before it, so the path is cut back to the parent of
+       each node expanded and the node pushed on its end. A path never holds
+       a state twice (successors already on it are pruned), so a set of
+       hashes suffices.'''
+
+    def __init__(self):
+        self.states = []
+        self.hashes = set()
+
+    def __contains__(self, hash_state):
+        return hash_state in self.hashes
+
+    def __len__(self):
+        return len(self.states)
+
+    def descend(self, state):
+        '''Makes the path end at state, which must be a child of a state on the path (or the initial state).'''
+        states = self.states
+        parent = state.parent
+        while states and states[-1] is not parent:
+            self.hashes.discard(states.pop().hashable_state())
+        if not states and parent:
+            # the search starts below the initial state of the path
+            ancestors = []
+            while parent:
+                ancestors.append(parent)
+                parent = parent.parent
+            for ancestor in reversed(ancestors):
+                states.append(ancestor)
+                self.hashes.add(ancestor.hashable_state())
+        states.append(state)
+        self.hashes.add(state.hashable_state())
+
+
+class _SMANode:
+    '''A node of the tree that the sma_star strategy keeps in memory. fval is
+       the node's f-value backed up from its subtree, forgotten the smallest
+       fval among the children dropped to free memory, and open_key the
+       node's key while it is on OPEN (None otherwise).'''
+
+    __slots__ = ('state', 'hval', 'gval', 'fval', 'depth', 'parent', 'children', 'forgotten', 'open_key')
+
+    def __init__(self, state, hval, fval, parent):
+        self.state = state
+        self.hval = hval
+        self.gval = state.gval
+        self.fval = fval
+        self.depth = parent.depth + 1 if parent else 0
+        self.parent = parent
+        self.children = []
+        self.forgotten = float('inf')
+        self.open_key = None
+
+
+# the SearchEngine counters saved by a checkpoint
+_CHECKPOINT_COUNTERS = ('nodes_created', 'states_generated', 'cycle_check_pruned', 'cost_bound_pruned',
+                        'deadlock_pruned')
+# the strategies that keep their own frontier rather than OPEN, so cannot be checkpointed
+_UNSAVED_STRATEGIES = (_BIDIRECTIONAL, _IDA_STAR, _SMA_STAR)
+
+
+def _pack_keys(hash_states):
+    '''The hashes as an array if they are all 64 bit unsigned integers (e.g., Zobrist keys), else as a list'''
+    try:
+        return array('Q', hash_states)
+    except (TypeError, OverflowError):
+        return list(hash_states)
+
+
 class SearchEngine:
-    def __init__(self, strategy='depth_first', cc_level='default'):
+    def __init__(self, strategy='depth_first', cc_level='default', decrease_key=False, node_budget=100000,
+                 compact=False):
+        '''decrease_key=True keeps at most one frontier entry per state for the
+           priority queue strategies (ucs, best_first, astar, custom), updating
+           the entry in place when a cheaper path is found instead of pushing a
+           duplicate and skipping the stale copy later. With full cycle
+           checking it also prunes a successor reached before at equal cost,
+           so no state is put back on OPEN (and expanded again) for every
+           path of the same cost to it.
+           node_budget is the most search nodes the sma_star strategy keeps in
+           memory at once.
+           compact=True keeps the cycle check dictionary of full cycle
+           checking in a StateStore and cuts every state from its parent once
+           it is generated, so states are freed once expanded. The path to
+           the goal found is rebuilt by replaying the recorded actions from
+           the initial state. Memory then grows with the states reached by a
+           few dozen bytes each, instead of with whole state objects.'''
         self.set_strategy(strategy, cc_level)
+        self.decrease_key = decrease_key
+        self.node_budget = node_budget
+        self.compact = compact
         self.trace = 0
+        self.listeners = []  # [listener, interval, states explored at its next progress event]
+        self.next_event = float('inf')
 
     def initStats(self):
-        sNode.n = 0
-        StateSpace.n = 1  # initial state already generated
+        # All counters live on the engine (and the insertion counter on its
+        # Open), so several engines can search concurrently in one process.
+        self.nodes_created = 0
+        self.states_generated = 1  # initial state already generated
         self.cycle_check_pruned = 0
         self.cost_bound_pruned = 0
+        self.deadlock_pruned = 0
+        self.backward_nodes_created = 0
+        self.backward_states_generated = 0
+        self.frontier_meets = 0
+        self.iterations = 0
+        self.states_reexpanded = 0
+        self.max_nodes_stored = 0
+        for entry in self.listeners:
+            entry[2] = entry[1]
+        self.next_event = min([entry[2] for entry in self.listeners], default=float('inf'))
+
+    def add_listener(self, listener, every=10000):
+        '''Calls listener with a SearchEvent when a search starts and
+           finishes, when it finds a cheaper solution (anytime and
+           bidirectional search), and every time it has explored every more
+           states. Without listeners the search only compares a counter.'''
+        self.listeners.append([listener, every, every])
+        self.next_event = min(self.next_event, every)
+
+    def remove_listener(self, listener):
+        self.listeners = [entry for entry in self.listeners if entry[0] is not listener]
+        self.next_event = min([entry[2] for entry in self.listeners], default=float('inf'))
+
+    def _emit(self, kind, frontier_size, dictionary_size, state=None, cost=None):
+        '''Calls the listeners with an event of kind, only those whose next progress event is due for progress events'''
+        now = self.deadline.clock()
+        elapsed = now - self.event_time
+        rate = (self.nodes_created - self.event_nodes) / elapsed if elapsed > 0 else 0.0
+        self.event_time = now
+        self.event_nodes = self.nodes_created
+        event = SearchEvent(kind, now - self.search_start_time, self.nodes_created, self.states_generated,
+                            frontier_size, dictionary_size, rate, state, cost)
+        for entry in self.listeners:
+            if kind != 'progress':
+                entry[0](event)
+            elif entry[2] <= self.nodes_created:
+                entry[0](event)
+                entry[2] = self.nodes_created + entry[1]
+        self.next_event = min([entry[2] for entry in self.listeners], default=float('inf'))
+
+    def _start_events(self):
+        self.event_time = self.search_start_time
+        self.event_nodes = self.nodes_created
 
     def trace_on(self, level=1):
         '''For debugging, set tracking level 1 or 2'''
@@ -301,16 +837,24 @@ class SearchEngine:
         self.trace = 0
 
     def set_strategy(self, s, cc='default'):
-        if not s in ['depth_first', 'breadth_first', 'ucs', 'best_first', 'astar', 'custom']:
+        if not s in ['depth_first', 'breadth_first', 'ucs', 'best_first', 'astar', 'custom', 'bidirectional',
+                     'ida_star', 'sma_star']:
             print('Unknown search strategy specified:', s)
-            print("Must be one of 'depth_first', 'ucs', 'breadth_first', 'best_first', 'custom' or 'astar'")
+            print("Must be one of 'depth_first', 'ucs', 'breadth_first', 'best_first', 'custom', 'astar', "
+                  "'bidirectional', 'ida_star' or 'sma_star'")
         elif not cc in ['default', 'none', 'path', 'full']:
             print('Unknown cycle check level', cc)
             print("Must be one of ['default', 'none', 'path', 'full']")
+        elif s == 'bidirectional' and cc in ['none', 'path']:
+            # the frontiers meet in the cycle check dictionaries
+            print('Bidirectional search needs full cycle checking')
+        elif s in ['ida_star', 'sma_star'] and cc == 'full':
+            # full cycle checking would keep every state reached in memory
+            print('Memory bounded search can only use path checking')
 
         else:
             if cc == 'default':
-                if s == 'depth_first':
+                if s in ['depth_first', 'ida_star', 'sma_star']:
                     self.cycle_check = _CC_PATH
                 else:
                     self.cycle_check = _CC_FULL
@@ -333,6 +877,12 @@ class SearchEngine:
                 self.strategy = _ASTAR
             elif s == 'custom':
                 self.strategy = _CUSTOM
+            elif s == 'bidirectional':
+                self.strategy = _BIDIRECTIONAL
+            elif s == 'ida_star':
+                self.strategy = _IDA_STAR
+            elif s == 'sma_star':
+                self.strategy = _SMA_STAR
 
     def get_strategy(self):
         if self.strategy == _DEPTH_FIRST:
@@ -347,6 +897,12 @@ class SearchEngine:
             rval = 'astar'
         elif self.strategy == _CUSTOM:
             rval = 'custom'
+        elif self.strategy == _BIDIRECTIONAL:
+            rval = 'bidirectional'
+        elif self.strategy == _IDA_STAR:
+            rval = 'ida_star'
+        elif self.strategy == _SMA_STAR:
+            rval = 'sma_star'
 
         rval = rval + ' with '
 
@@ -359,7 +915,8 @@ class SearchEngine:
 
         return rval
 
-    def init_search(self, initState, goal_fn, heur_fn=_zero_hfn, fval_function=_fval_function):
+    def init_search(self, initState, goal_fn, heur_fn=_zero_hfn, fval_function=_fval_function, goal_states=None,
+                    backward_heur_fn=_zero_hfn):
         """
         Get ready to search. Call search on this object to run the search.
 
@@ -367,16 +924,22 @@ class SearchEngine:
         @param goal_fn: the goal function for the puzzle
         @param heur_fn: the heuristic function to use (only relevant for search strategies that use heuristics)
         @param fval_fn: the f-value function (only relevant for custom search strategy)
+        @param goal_states: the goal states to search backwards from (only relevant for bidirectional search)
+        @param backward_heur_fn: the heuristic estimating the cost from the initial state to a state, for the backward
+                                 frontier of bidirectional search
         """
         # Perform full cycle checking as follows
         # a. check state before inserting into OPEN. If we had already reached
-        #   the same state via a cheaper path, don't insert into OPEN.
+        #   the same state via a cheaper path (or, with decrease_key, one no
+        #   more expensive), don't insert into OPEN.
         # b. Sometimes we find a new cheaper path to a state (after the older
         #   more expensive path to the state has already been inserted.
         #   We deal with this lazily. We check states extracted from OPEN
         #   and if we have already expanded that state via a cheaper path
         #   we don't expand it. If we had expanded the state via a more
         #   expensive path, we re-expand it.
+        #   With decrease_key the older entry is instead replaced in OPEN,
+        #   so OPEN never holds more than one node for a state.
 
         self.initStats()
 
@@ -386,48 +949,375 @@ class SearchEngine:
             print("   TRACE: Initial State:", end="")
             initState.print_state()
         # END
-        self.open = Open(self.strategy)
+        self.open = Open(self.strategy, self.decrease_key, fval_function)
+        if isinstance(heur_fn, CachedHeuristic):
+            heur_fn = heur_fn.view()
 
-        node = sNode(initState, heur_fn(initState), fval_function)
+        node = sNode(initState, heur_fn(initState))
+        self.nodes_created = self.nodes_created + 1
 
         # the cycle check dictionary stores the cheapest path (g-val) found
         # so far to a state.
-        if self.cycle_check == _CC_FULL:
-            self.cc_dictionary = dict()
-            self.cc_dictionary[initState.hashable_state()] = initState.gval
+        if self.cycle_check == _CC_FULL and self.strategy != _BIDIRECTIONAL:
+            if self.compact:
+                self.cc_dictionary = StateStore()
+                self.cc_dictionary.add(initState.hashable_state(), initState.gval, -1, initState.action)
+            else:
+                self.cc_dictionary = dict()
+                self.cc_dictionary[initState.hashable_state()] = initState.gval
+        self.initial_state = initState
 
         self.open.insert(node)
         self.fval_function = fval_function
         self.goal_fn = goal_fn
         self.heur_fn = heur_fn
-
-    def search(self, timebound=None, costbound=None):
+        self.backward_open = None
+        if self.strategy == _BIDIRECTIONAL:
+            self._init_backward(initState, goal_states, backward_heur_fn)
+        self.cache_counters_start = self._cache_counters()
+
+    def _init_backward(self, initState, goal_states, backward_heur_fn):
+        '''Sets up the backward frontier of bidirectional search, holding the goal states.'''
+        if goal_states is None:
+            raise Exception("Bidirectional search needs the goal states to search backwards from")
+        self.backward_open = Open(self.strategy, self.decrease_key)
+        self.backward_heur_fn = backward_heur_fn
+
+        # Instead of the cycle check dictionary, each direction maps every
+        # state it has reached to the cheapest state object found for it, so
+        # the paths can be joined where the two searches meet.
+        self.forward_reached = {initState.hashable_state(): initState}
+        self.backward_reached = dict()
+        self.best_meet = None  # (cost, forward state, backward state) of the cheapest meet so far
+
+        for state in goal_states:
+            hash_state = state.hashable_state()
+            if hash_state in self.backward_reached:
+                continue
+            state.index = self.states_generated
+            self.states_generated = self.states_generated + 1
+            self.backward_states_generated = self.backward_states_generated + 1
+            self.backward_reached[hash_state] = state
+            self.backward_open.insert(sNode(state, backward_heur_fn(state)))
+            self.nodes_created = self.nodes_created + 1
+            self.backward_nodes_created = self.backward_nodes_created + 1
+            if hash_state in self.forward_reached:
+                # the initial state is a goal
+                self.best_meet = (initState.gval + state.gval, initState, state)
+
+    def _cache_counters(self):
+        '''The hit, miss and eviction counts of the heuristic, if it is a CachedHeuristic'''
+        if isinstance(self.heur_fn, CachedHeuristic):
+            return self.heur_fn.cache_counters()
+        return 0, 0, 0
+
+    def search(self, timebound=None, costbound=None, deadline=None, checkpoint=None):
         """
-        Start searching, using the parameters set by init_search.
+        Start searching, using the parameters set by init_search (or carry on a search that ran out of time).
 
         @param timebound: the maximum amount of time, in seconds, to spend on this search.
         @param costbound: the cost bound 3-tuple for pruning, as specified in the assignment.
+        @param deadline: a Deadline to search within instead of timebound (e.g., one shared with earlier searches).
+        @param checkpoint: a file to save the search to (see save_checkpoint) if it stops without a goal while states
+                           are left on OPEN. Only for the strategies that save_checkpoint can save.
 
         This code will return a goal path (if one is found) as well as a SearchStat object containing
         statistics about the given search (assuming a solution is found).
         """
 
-        ###NOW do the search and return the result
-        self.search_start_time = os.times()[0]
-        self.search_stop_time = None
-        if timebound:
-            self.search_stop_time = self.search_start_time + timebound
+        if checkpoint and self.strategy in _UNSAVED_STRATEGIES:
+            raise Exception("Only the strategies searching from OPEN can be checkpointed, not " + self.get_strategy())
 
-        goal_node = self._searchOpen(self.goal_fn, self.heur_fn, self.fval_function, costbound)
-
-        total_search_time = os.times()[0] - self.search_start_time
-        stats = SearchStats(sNode.n, StateSpace.n, self.cycle_check_pruned, self.cost_bound_pruned, total_search_time)
-
-        if goal_node:
-            return goal_node.state, stats
+        ###NOW do the search and return the result
+        self.deadline = deadline if deadline else Deadline(timebound)
+        self.search_start_time = self.deadline.clock()
+        self._start_events()
+        if self.listeners:
+            self._emit('start', len(self.open), self._dictionary_size())
+
+        if self.strategy == _BIDIRECTIONAL:
+            goal = self._searchBidirectional(self.goal_fn, costbound)
+        elif self.strategy in (_IDA_STAR, _SMA_STAR):
+            if self.strategy == _IDA_STAR:
+                goal_node = self._searchIDAStar(self.goal_fn, self.heur_fn, costbound)
+            else:
+                goal_node = self._searchSMAStar(self.goal_fn, self.heur_fn, costbound)
+            goal = goal_node and goal_node.state
+        else:
+            goal_node = self._searchOpen(self.goal_fn, self.heur_fn, self.fval_function, costbound)
+            goal = goal_node and goal_node.state
+            if goal and self.compact and self.cycle_check == _CC_FULL:
+                # the states on the path were freed, so replay the path recorded for the goal
+                goal = self.initial_state.replay(self.cc_dictionary.path_actions(goal.hashable_state()))
+
+        if checkpoint and not goal and not self.open.empty():
+            self.save_checkpoint(checkpoint)
+        stats = self._stats()
+        if self.listeners:
+            self._emit('finish', len(self.open), self._dictionary_size(), goal or None, goal.gval if goal else None)
+        if goal:
+            return goal, stats
         else:  # exited the while without finding goal---search failed
             return False, stats
 
+    def _dictionary_size(self):
+        '''The number of states in the cycle check dictionary (or dictionaries) of search'''
+        if self.strategy == _BIDIRECTIONAL:
+            return len(self.forward_reached) + len(self.backward_reached)
+        if self.cycle_check == _CC_FULL:
+            return len(self.cc_dictionary)
+        return 0
+
+    def _stats(self):
+        '''A SearchStats object with the counts of the search so far'''
+        duplicates_avoided = self.open.duplicates_avoided()
+        if self.backward_open:
+            duplicates_avoided = duplicates_avoided + self.backward_open.duplicates_avoided()
+        total_search_time = self.deadline.clock() - self.search_start_time
+        return SearchStats(self.nodes_created, self.states_generated, self.cycle_check_pruned, self.cost_bound_pruned, total_search_time,
+                           duplicates_avoided, self.deadlock_pruned,
+                           tuple(now - start for now, start in zip(self._cache_counters(), self.cache_counters_start)),
+                           (self.backward_nodes_created, self.backward_states_generated, self.frontier_meets),
+                           (self.iterations, self.states_reexpanded, self.max_nodes_stored))
+
+    def save_checkpoint(self, path):
+        '''
+        Saves the search (its strategy, OPEN, the cycle check dictionary and the counters) to the file at path, so
+        that resume() can carry it on in another process. Only the strategies searching from OPEN (depth_first,
+        breadth_first, ucs, best_first, astar and custom) can be saved, between calls to search.
+
+        The file is compact: the cycle check dictionary is saved as arrays of hashes and gvals (of IDs, with
+        compact=True), and nodes on OPEN that a cheaper path made stale are left out. OPEN is saved in insertion order,
+        so ties break as they would have. With compact=True the states on OPEN are saved packed (see
+        StateSpace.pack), as their paths are in the StateStore. Otherwise the paths to the states on OPEN are saved
+        as one tree of actions and rebuilt by replaying them. The file is written next to path and then renamed, so
+        a crash while saving leaves any earlier checkpoint whole.
+        '''
+        if self.strategy in _UNSAVED_STRATEGIES:
+            raise Exception("Only the strategies searching from OPEN can be checkpointed, not " + self.get_strategy())
+        full = self.cycle_check == _CC_FULL
+        nodes = [node for node in self.open.nodes(ordered=True)
+                 if not full or self.cc_dictionary[node.state.hashable_state()] >= node.gval]
+        checkpoint = {'strategy': self.strategy, 'cycle_check': self.cycle_check,
+                      'decrease_key': self.decrease_key, 'node_budget': self.node_budget, 'compact': self.compact,
+                      'counters': [getattr(self, name) for name in _CHECKPOINT_COUNTERS],
+                      'initial_state': self.initial_state,
+                      'gvals': array('d', [node.gval for node in nodes]),
+                      'hvals': array('d', [node.hval for node in nodes])}
+
+        if self.compact and full:
+            store = self.cc_dictionary
+            checkpoint['states'] = b''.join(node.state.pack() for node in nodes)
+            checkpoint['store'] = (_pack_keys(store.ids), store.gvals, store.parents, store.actions,
+                                   store.action_names)
+        else:
+            # number the states on the paths to the nodes, parents first, and record the action reaching each
+            numbers = dict()  # id(state) -> its number
+            roots = dict()  # number -> state, for the states without a parent
+            parents = array('q')
+            actions = array('I')
+            action_ids = dict()
+            frontier = array('q')
+            for node in nodes:
+                chain = []
+                s = node.state
+                while s is not None and id(s) not in numbers:
+                    chain.append(s)
+                    s = s.parent
+                parent = numbers[id(s)] if s is not None else -1
+                for s in reversed(chain):
+                    numbers[id(s)] = len(parents)
+                    if parent < 0:
+                        roots[len(parents)] = s
+                    parents.append(parent)
+                    actions.append(action_ids.setdefault(s.action, len(action_ids)))
+                    parent = numbers[id(s)]
+                frontier.append(numbers[id(node.state)])
+            checkpoint['tree'] = (roots, parents, actions, list(action_ids), frontier)
+            if full:
+                checkpoint['cc_dictionary'] = (_pack_keys(self.cc_dictionary),
+                                               array('d', self.cc_dictionary.values()))
+
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def resume(cls, path, goal_fn, heur_fn=_zero_hfn, fval_function=_fval_function):
+        '''
+        Returns a SearchEngine carrying on the search saved to the file at path by save_checkpoint, ready for search to
+        be called. Functions are not saved, so the goal, heuristic and fval functions must be given again.
+        '''
+        with open(path, 'rb') as f:
+            checkpoint = pickle.load(f)
+        se = cls(decrease_key=checkpoint['decrease_key'], node_budget=checkpoint['node_budget'],
+                 compact=checkpoint['compact'])
+        se.strategy = checkpoint['strategy']
+        se.cycle_check = checkpoint['cycle_check']
+        se.initStats()
+        for name, value in zip(_CHECKPOINT_COUNTERS, checkpoint['counters']):
+            setattr(se, name, value)
+        se.initial_state = initState = checkpoint['initial_state']
+        se.open = Open(se.strategy, se.decrease_key, fval_function)
+        se.fval_function = fval_function
+        se.goal_fn = goal_fn
+        se.heur_fn = heur_fn.view() if isinstance(heur_fn, CachedHeuristic) else heur_fn
+        se.backward_open = None
+
+        if 'store' in checkpoint:
+            keys, gvals, parents, actions, action_names = checkpoint['store']
+            se.cc_dictionary = store = StateStore()
+            store.ids = dict(zip(keys, range(len(gvals))))
+            store.gvals, store.parents, store.actions = gvals, parents, actions
+            store.action_names = action_names
+            store.action_ids = dict(zip(action_names, range(len(action_names))))
+            size = len(checkpoint['states']) // len(checkpoint['gvals']) if checkpoint['gvals'] else 0
+            states = [initState.unpack(checkpoint['states'][i * size:(i + 1) * size], gval)
+                      for i, gval in enumerate(checkpoint['gvals'])]
+        else:
+            roots, parents, actions, action_names, frontier = checkpoint['tree']
+            # rebuild the states on the paths, generating the successors of each parent once
+            tree = []
+            successors = dict()  # number of a parent -> its successors by action
+            for number, parent in enumerate(parents):
+                if parent < 0:
+                    tree.append(roots[number])
+                    continue
+                if parent not in successors:
+                    successors[parent] = dict((succ.action, succ) for succ in tree[parent].successors())
+                tree.append(successors[parent][action_names[actions[number]]])
+            states = [tree[number] for number in frontier]
+            if 'cc_dictionary' in checkpoint:
+                keys, gvals = checkpoint['cc_dictionary']
+                se.cc_dictionary = dict(zip(keys, gvals))
+
+        for state, hval in zip(states, checkpoint['hvals']):
+            se.open.insert(sNode(state, hval))
+        se.cache_counters_start = se._cache_counters()
+        return se
+
+    def anytime_search(self, weight=10, timebound=None, weight_decay=1.5, deadline=None):
+        """
+        Anytime search (ARA*) from the initial state set by init_search, with its goal and heuristic functions.
+        A generator: every time a cheaper solution is found, yields it with a SearchStats object covering the search so
+        far, so the caller can stop whenever it likes. After each solution, self.suboptimality_bound holds how many
+        times the optimal cost (for an admissible heuristic) the solution can at most be.
+
+        Each iteration is a weighted A* on f = g + weight * h that stops once no node on OPEN has a smaller f than the
+        best solution. The weight is then divided by weight_decay (down to 1) and the next iteration carries on with
+        the same OPEN, re-keyed with the new weight, and the same best paths found to each state. A state expanded in
+        the current iteration that is reached by a cheaper path goes on the INCONS list rather than back on OPEN,
+        and INCONS is merged into OPEN for the next iteration. Once a solution is found, states with g + h no smaller
+        than its cost are pruned. The search ends after the iteration with weight 1, when OPEN runs out or when the
+        time bound is exceeded.
+
+        @param weight: the weight of the heuristic in the first iteration.
+        @param timebound: the maximum amount of time, in seconds, to spend on the whole search.
+        @param weight_decay: the factor the weight is divided by after each iteration.
+        @param deadline: a Deadline to search within instead of timebound.
+        """
+        self.deadline = deadline if deadline else Deadline(timebound)
+        self.search_start_time = self.deadline.clock()
+        self._start_events()
+        goal_fn = self.goal_fn
+        heur_fn = self.heur_fn
+
+        root = self.open.extract()
+        hash_state = root.state.hashable_state()
+        reached = {hash_state: root.state}  # the cheapest path (state object) found to each state
+        open_states = {hash_state: root}  # the states on OPEN, with their nodes
+        incons = dict()
+        closed = dict()  # every state expanded, with the last iteration that expanded it
+        counter = itertools.count()
+        best = root.state if goal_fn(root.state) else None
+        weight = max(weight, 1)
+        if self.listeners:
+            self._emit('start', 1, 1)
+
+        while True:
+            self.iterations = self.iterations + 1
+            # BEGIN TRACING
+            if self.trace:
+                print("   TRACE: Iteration {} with weight {}".format(self.iterations, weight))
+            # END TRACING
+            # re-key OPEN for the new weight; entries for states since reached by a cheaper path are skipped
+            heap = [(node.gval + weight * node.hval, -node.gval, next(counter), node) for node in open_states.values()]
+            heapq.heapify(heap)
+            found = best
+
+            while heap:
+                fval, _, _, node = heap[0]
+                hash_state = node.state.hashable_state()
+                if open_states.get(hash_state) is not node:
+                    heapq.heappop(heap)
+                    continue
+                if best is not None and best.gval <= fval:
+                    break
+                heapq.heappop(heap)
+                del open_states[hash_state]
+                if hash_state in closed:
+                    self.states_reexpanded = self.states_reexpanded + 1
+                closed[hash_state] = self.iterations
+                if self.deadline.expired():
+                    # exceeded time bound, must terminate search
+                    print("TRACE: Search has exceeeded the time bound provided.")
+                    if self.listeners:
+                        self._emit('finish', len(open_states), len(reached), best, best and best.gval)
+                    return
+
+                successors = node.state.successors()
+                self.deadlock_pruned = self.deadlock_pruned + getattr(successors, 'pruned', 0)
+                for succ in successors:
+                    succ.index = self.states_generated
+                    self.states_generated = self.states_generated + 1
+                    hash_state = succ.hashable_state()
+                    if hash_state in reached and succ.gval >= reached[hash_state].gval:
+                        self.cycle_check_pruned = self.cycle_check_pruned + 1
+                        continue
+                    succ_hval = heur_fn(succ)
+                    if best is not None and succ.gval + succ_hval >= best.gval:
+                        self.cost_bound_pruned = self.cost_bound_pruned + 1
+                        continue
+
+                    reached[hash_state] = succ
+                    succ_node = sNode(succ, succ_hval)
+                    self.nodes_created = self.nodes_created + 1
+                    if goal_fn(succ) and (best is None or succ.gval < best.gval):
+                        best = succ
+                    if closed.get(hash_state) == self.iterations:
+                        incons[hash_state] = succ_node
+                    else:
+                        open_states[hash_state] = succ_node
+                        heapq.heappush(heap, (succ.gval + weight * succ_hval, -succ.gval, next(counter), succ_node))
+                if self.nodes_created >= self.next_event:
+                    self._emit('progress', len(open_states), len(reached))
+
+            if best is None:
+                # OPEN ran out without a solution
+                if self.listeners:
+                    self._emit('finish', 0, len(reached))
+                return
+            # the nodes on OPEN and INCONS that cannot lead to a cheaper solution are dropped
+            open_states = dict((hash_state, node) for hash_state, node in open_states.items()
+                               if node.gval + node.hval < best.gval)
+            incons = dict((hash_state, node) for hash_state, node in incons.items()
+                          if node.gval + node.hval < best.gval)
+            if best is not found:
+                lower = min([node.gval + node.hval for node in open_states.values()] +
+                            [node.gval + node.hval for node in incons.values()], default=best.gval)
+                self.suboptimality_bound = min(weight, best.gval / lower) if lower > 0 else weight
+                if self.listeners:
+                    self._emit('incumbent', len(open_states), len(reached), best, best.gval)
+                yield best, self._stats()
+            if weight == 1 or not open_states and not incons:
+                if self.listeners:
+                    self._emit('finish', len(open_states), len(reached), best, best.gval)
+                return
+
+            weight = max(weight / weight_decay, 1)
+            open_states.update(incons)
+            incons = dict()
+
     def _searchOpen(self, goal_fn, heur_fn, fval_function, costbound):
         """
         Search, starting from self.open.
@@ -443,6 +1333,9 @@ class SearchEngine:
             if self.cycle_check == _CC_FULL:
                 print("   TRACE: Initial CC_Dict:", self.cc_dictionary)
         # END TRACING
+        # depth first search path checks against the path to the node being expanded, other strategies walk the
+        # parent chain of the successor
+        path = _Path() if self.cycle_check == _CC_PATH and self.strategy == _DEPTH_FIRST else None
         while not self.open.empty():
             node = self.open.extract()
             # node.state.print_state()
@@ -458,11 +1351,12 @@ class SearchEngine:
             if goal_fn(node.state):
                 # node at front of OPEN is a goal...search is completed.
                 return node
-            if self.search_stop_time:  # timebound check
-                if os.times()[0] > self.search_stop_time:
-                    # exceeded time bound, must terminate search
-                    print("TRACE: Search has exceeeded the time bound provided.")
-                    return False
+            if self.deadline.expired():
+                # exceeded time bound, must terminate search (putting the node back where it was, so the search can
+                # go on later)
+                print("TRACE: Search has exceeeded the time bound provided.")
+                self.open.putback(node)
+                return False
 
             # All states reached by a search node on OPEN have already
             # been hashed into the self.cc_dictionary. However,
@@ -479,8 +1373,16 @@ class SearchEngine:
 
             if self.cycle_check == _CC_FULL and self.cc_dictionary[node.state.hashable_state()] < node.gval:
                 continue
+            if self.cycle_check == _CC_FULL and self.compact:
+                node_id = self.cc_dictionary.ids[node.state.hashable_state()]
+            if path is not None:
+                path.descend(node.state)
 
             successors = node.state.successors()
+            self.deadlock_pruned = self.deadlock_pruned + getattr(successors, 'pruned', 0)
+            for succ in successors:
+                succ.index = self.states_generated
+                self.states_generated = self.states_generated + 1
 
             # BEGIN TRACING
             if self.trace:
@@ -508,16 +1410,18 @@ class SearchEngine:
                         print("   TRACE: Already in CC_dict, CC_dict gval={}, successor state gval={}".format(
                             self.cc_dictionary[hash_state], succ.gval))
 
-                    if self.cycle_check == _CC_PATH and succ.has_path_cycle():
+                    if self.cycle_check == _CC_PATH and (hash_state in path if path is not None
+                                                         else succ.has_path_cycle()):
                         print("   TRACE: On cyclic path")
                 # END TRACING
 
                 prune_succ = (self.cycle_check == _CC_FULL and
                               hash_state in self.cc_dictionary and
-                              succ.gval > self.cc_dictionary[hash_state]
+                              (succ.gval > self.cc_dictionary[hash_state] or
+                               self.decrease_key and succ.gval == self.cc_dictionary[hash_state])
                               ) or (
                                      self.cycle_check == _CC_PATH and
-                                     succ.has_path_cycle()
+                                     (hash_state in path if path is not None else succ.has_path_cycle())
                              )
 
                 if prune_succ:
@@ -540,7 +1444,8 @@ class SearchEngine:
                     continue
 
                     # passed all cycle checks and costbound checks ...add to open
-                self.open.insert(sNode(succ, succ_hval, node.fval_function))
+                self.open.insert(sNode(succ, succ_hval))
+                self.nodes_created = self.nodes_created + 1
 
                 # BEGIN TRACING
                 if self.trace > 1:
@@ -550,9 +1455,328 @@ class SearchEngine:
 
                 # record cost of this path in dictionary.
                 if self.cycle_check == _CC_FULL:
-                    self.cc_dictionary[hash_state] = succ.gval
+                    if self.compact:
+                        self.cc_dictionary.add(hash_state, succ.gval, node_id, succ.action)
+                        # the path is recorded, so the state need not keep its parent (and the states above) alive
+                        succ.parent = None
+                    else:
+                        self.cc_dictionary[hash_state] = succ.gval
+
+            if self.nodes_created >= self.next_event:
+                self._emit('progress', len(self.open), self._dictionary_size())
 
         # end of while--OPEN is empty and no solution
         return False
 
+    def _searchIDAStar(self, goal_fn, heur_fn, costbound):
+        """
+        IDA*: repeated depth first searches from the initial state that only follow nodes whose fval = gval + hval is
+        within a threshold. The threshold starts at the fval of the initial state and is raised after each iteration
+        to the smallest fval that went over it. Only the current path and the siblings still to be explored along it
+        are stored, so memory is linear in the depth. Expanding a node whose fval was within the previous threshold
+        counts as a re-expansion.
+
+        @param goal_fn: the goal function.
+        @param heur_fn: the heuristic function.
+        @param costbound: the cost bound 3-tuple, as described in the assignment.
+        """
+        root = self.open.extract()
+        threshold = root.gval + root.hval
+        previous = None
+        while True:
+            self.iterations = self.iterations + 1
+            next_threshold = float('inf')
+            # BEGIN TRACING
+            if self.trace:
+                print("   TRACE: Iteration {} with threshold {}".format(self.iterations, threshold))
+            # END TRACING
+            stack = [root]
+            path = _Path() if self.cycle_check == _CC_PATH else None
+            while stack:
+                node = stack.pop()
+                if goal_fn(node.state):
+                    return node
+                if self.deadline.expired():
+                    # exceeded time bound, must terminate search
+                    print("TRACE: Search has exceeeded the time bound provided.")
+                    return False
+                if previous is not None and node.gval + node.hval <= previous:
+                    self.states_reexpanded = self.states_reexpanded + 1
+                if path is not None:
+                    path.descend(node.state)
+
+                for succ, succ_hval in self._expand(node, heur_fn, costbound, path):
+                    if succ.gval + succ_hval > threshold:
+                        next_threshold = min(next_threshold, succ.gval + succ_hval)
+                        continue
+                    stack.append(sNode(succ, succ_hval))
+                    self.nodes_created = self.nodes_created + 1
+                self.max_nodes_stored = max(self.max_nodes_stored, len(stack))
+                if self.nodes_created >= self.next_event:
+                    self._emit('progress', len(stack), 0)
+
+            if next_threshold == float('inf'):
+                return False
+            previous, threshold = threshold, next_threshold
+
+    def _searchSMAStar(self, goal_fn, heur_fn, costbound):
+        """
+        SMA*: A* that keeps at most self.node_budget nodes in memory. When memory is full, a successor is only added
+        after forgetting the leaf with the greatest fval (the shallowest, among equal ones), and is itself forgotten
+        at once if it is no better than that leaf. The parent of forgotten nodes remembers the smallest fval forgotten
+        below it and goes back on OPEN with that fval, to generate them again when it is the best node left. fvals
+        are backed up from the children, so the fval of a node is the best lower bound known for the cost of a
+        solution through it. Expanding a node again to regenerate forgotten successors counts as a re-expansion.
+        The heaps holding OPEN are rebuilt whenever their stale entries outnumber the others, so a forgotten node is
+        freed within a few expansions, and no more than about three times the budget of nodes are ever alive.
+
+        @param goal_fn: the goal function.
+        @param heur_fn: the heuristic function.
+        @param costbound: the cost bound 3-tuple, as described in the assignment.
+        """
+        budget = max(self.node_budget, 2)
+        infinity = float('inf')
+        # OPEN, with the lowest fval (the deepest, among equal ones) first, and the leaves on OPEN with the greatest
+        # fval (the shallowest, among equal ones) first. Entries whose key is no longer the node's are skipped, and
+        # dropped when they outnumber the others.
+        best = []
+        worst = []
+        counter = itertools.count()
+
+        def push(node, key):
+            node.open_key = key
+            heapq.heappush(best, (key, -node.depth, next(counter), node))
+            heapq.heappush(worst, (-key, node.depth, next(counter), node))
+            if len(best) > 2 * stored:
+                best[:] = live_entries(best, 1)
+            if len(worst) > 2 * stored:
+                worst[:] = live_entries(worst, -1)
+
+        def live_entries(heap, sign):
+            '''Returns the entries of heap still current (one per node; for worst, only those of leaves), as a heap.'''
+            entries = []
+            seen = set()
+            for entry in heap:
+                node = entry[-1]
+                if sign * entry[0] == node.open_key and id(node) not in seen and (sign > 0 or not node.children):
+                    seen.add(id(node))
+                    entries.append(entry)
+            heapq.heapify(entries)
+            return entries
+
+        def worst_leaf():
+            '''Returns the leaf on OPEN with the greatest fval (the shallowest, among equal ones), or None.'''
+            while worst:
+                key, _, _, leaf = worst[0]
+                if -key == leaf.open_key and not leaf.children:
+                    return leaf
+                heapq.heappop(worst)
+            return None
+
+        start = self.open.extract()
+        root = _SMANode(start.state, start.hval, start.gval + start.hval, None)
+        stored = 1
+        push(root, root.fval)
+        while best:
+            key, _, _, node = heapq.heappop(best)
+            if key != node.open_key:
+                continue
+            if key == infinity:
+                # every path left runs into a dead end or out of memory
+                return False
+            node.open_key = None
+            # BEGIN TRACING
+            if self.trace:
+                print("   TRACE: Next State to expand: <S{}:{}:{}, g={}, h={}, f={}>".format(
+                    node.state.index, node.state.action, node.state.hashable_state(), node.gval, node.hval,
+                    node.fval))
+            # END TRACING
+            if goal_fn(node.state):
+                return node
+            if self.deadline.expired():
+                # exceeded time bound, must terminate search
+                print("TRACE: Search has exceeeded the time bound provided.")
+                return False
+
+            if node.forgotten < infinity:
+                # regenerate the successors that were forgotten
+                self.states_reexpanded = self.states_reexpanded + 1
+                kept = set(child.state.hashable_state() for child in node.children)
+                floor = node.forgotten
+                node.forgotten = infinity
+            else:
+                kept = ()
+                floor = node.fval
+            for succ, succ_hval in self._expand(node, heur_fn, costbound):
+                if kept and succ.hashable_state() in kept:
+                    continue
+                fval = max(succ.gval + succ_hval, floor)
+                if node.depth + 2 >= budget and not goal_fn(succ):
+                    # its successors could never be in memory along with its path
+                    fval = infinity
+                if stored >= budget:
+                    # make room by forgetting the worst leaf, unless the successor is no better than it
+                    leaf = worst_leaf()
+                    if leaf is None or (-fval, node.depth + 1) <= (-leaf.open_key, leaf.depth):
+                        node.forgotten = min(node.forgotten, fval)
+                        continue
+                    heapq.heappop(worst)
+                    leaf.open_key = None
+                    parent = leaf.parent
+                    parent.children.remove(leaf)
+                    stored = stored - 1
+                    parent.forgotten = min(parent.forgotten, leaf.fval)
+                    if not parent.children or parent.forgotten < infinity and parent.open_key != parent.forgotten:
+                        push(parent, parent.forgotten)
+                child = _SMANode(succ, succ_hval, fval, node)
+                node.children.append(child)
+                push(child, fval)
+                stored = stored + 1
+                self.nodes_created = self.nodes_created + 1
+                self.max_nodes_stored = max(self.max_nodes_stored, stored)
+
+            # back up the fvals
+            backed_up = node
+            while backed_up:
+                fval = min([child.fval for child in backed_up.children] + [backed_up.forgotten])
+                if fval == backed_up.fval:
+                    break
+                backed_up.fval = fval
+                backed_up = backed_up.parent
+            if not node.children:
+                push(node, node.fval)
+            elif node.forgotten < infinity and node.open_key != node.forgotten:
+                push(node, node.forgotten)
+            if self.nodes_created >= self.next_event:
+                self._emit('progress', stored, 0)
+        return False
+
+    def _expand(self, node, heur_fn, costbound, path=None):
+        '''Returns the successors of the state of node that pass path checking
+           and the cost bound, with their hvals, for the memory bounded
+           strategies. Path checking is against path (a _Path ending at the
+           state of node) if given, else along the parent chain.'''
+        successors = node.state.successors()
+        self.deadlock_pruned = self.deadlock_pruned + getattr(successors, 'pruned', 0)
+        children = []
+        for succ in successors:
+            succ.index = self.states_generated
+            self.states_generated = self.states_generated + 1
+            if self.cycle_check == _CC_PATH and (succ.hashable_state() in path if path is not None
+                                                 else succ.has_path_cycle()):
+                self.cycle_check_pruned = self.cycle_check_pruned + 1
+                continue
+            succ_hval = heur_fn(succ)
+            if costbound is not None and (succ.gval > costbound[0] or
+                                          succ_hval > costbound[1] or
+                                          succ.gval + succ_hval > costbound[2]):
+                self.cost_bound_pruned = self.cost_bound_pruned + 1
+                continue
+            children.append((succ, succ_hval))
+        return children
+
+    def _searchBidirectional(self, goal_fn, costbound):
+        """
+        Bidirectional search: a forward search from self.open and a backward search (through the predecessors of
+        states) from self.backward_open, expanding from whichever frontier is smaller (Pohl's cardinality criterion).
+        A state generated by one search that the other has already reached is a meet, and the cheapest meet is
+        returned once no cheaper one can remain: when its cost is no greater than the smallest fval on one of the
+        frontiers or, if neither search uses a heuristic, than the sum of the smallest gvals on both. The forward
+        search also applies the goal function, so it is still complete if goal_states holds only some goal states.
+
+        @param goal_fn: the goal function.
+        @param costbound: the cost bound 3-tuple, as described in the assignment.
+        """
+        forward = (self.open, self.forward_reached, self.heur_fn, self.backward_reached)
+        backward = (self.backward_open, self.backward_reached, self.backward_heur_fn, self.forward_reached)
+        uninformed = self.heur_fn is _zero_hfn and self.backward_heur_fn is _zero_hfn
+
+        while not self.open.empty():
+            if self.best_meet:
+                bounds = [side[0].min_fval() for side in (forward, backward) if not side[0].empty()]
+                if self.best_meet[0] <= max(bounds) or uninformed and self.best_meet[0] <= sum(bounds):
+                    break
+            if self.deadline.expired():
+                # exceeded time bound, must terminate search
+                print("TRACE: Search has exceeeded the time bound provided.")
+                return False
+
+            if self.backward_open.empty() or len(self.open) <= len(self.backward_open):
+                side = forward
+            else:
+                side = backward
+            side_open, reached, heur_fn, other_reached = side
+
+            node = side_open.extract()
+            # BEGIN TRACING
+            if self.trace:
+                print("   TRACE: Next State to expand {}: <S{}:{}:{}, g={}, h={}, f=g+h={}>".format(
+                    "forward" if side is forward else "backward", node.state.index, node.state.action,
+                    node.state.hashable_state(), node.gval, node.hval, node.gval + node.hval))
+            # END TRACING
+            if reached[node.state.hashable_state()].gval < node.gval:
+                continue
+            if side is forward and goal_fn(node.state):
+                # the forward search reached a goal without meeting the backward search
+                self._meet(node.state, None)
+                continue
+
+            if side is forward:
+                successors = node.state.successors()
+            else:
+                successors = node.state.predecessors()
+            self.deadlock_pruned = self.deadlock_pruned + getattr(successors, 'pruned', 0)
+
+            for succ in successors:
+                succ.index = self.states_generated
+                self.states_generated = self.states_generated + 1
+                if side is backward:
+                    self.backward_states_generated = self.backward_states_generated + 1
+
+                hash_state = succ.hashable_state()
+                if hash_state in reached and succ.gval > reached[hash_state].gval:
+                    self.cycle_check_pruned = self.cycle_check_pruned + 1
+                    continue
+
+                succ_hval = heur_fn(succ)
+                if costbound is not None and (succ.gval > costbound[0] or
+                                              succ_hval > costbound[1] or
+                                              succ.gval + succ_hval > costbound[2]):
+                    self.cost_bound_pruned = self.cost_bound_pruned + 1
+                    continue
 
+                side_open.insert(sNode(succ, succ_hval))
+                self.nodes_created = self.nodes_created + 1
+                if side is backward:
+                    self.backward_nodes_created = self.backward_nodes_created + 1
+                reached[hash_state] = succ
+
+                met = other_reached.get(hash_state)
+                if met is not None:
+                    self.frontier_meets = self.frontier_meets + 1
+                    if side is forward:
+                        self._meet(succ, met)
+                    else:
+                        self._meet(met, succ)
+
+            if self.nodes_created >= self.next_event:
+                self._emit('progress', len(self.open) + len(self.backward_open), self._dictionary_size())
+
+        if not self.best_meet:
+            return False
+        # replay the backward half of the path forwards from where the searches met
+        _, state, backward_state = self.best_meet
+        actions = []
+        while backward_state and backward_state.parent:
+            actions.append(backward_state.action)
+            backward_state = backward_state.parent
+        return state.replay(actions)
+
+    def _meet(self, state, backward_state):
+        '''Records the path through state (reached forwards) and backward_state (reached backwards, None if state is
+           a goal itself) if it is the cheapest found so far'''
+        cost = state.gval + (backward_state.gval if backward_state else 0)
+        if self.best_meet is None or cost < self.best_meet[0]:
+            self.best_meet = (cost, state, backward_state)
+            if self.listeners:
+                self._emit('incumbent', len(self.open) + len(self.backward_open), self._dictionary_size(), None, cost)
@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+import traceback
+
+from search import *
+from sokoban import PROBLEMS, sokoban_goal_state
+from solution import heur_manhattan_distance, heur_zero
+from external import ExternalSearchEngine
+from hda import HDAStarEngine
+
+
+class Expansions(Deadline):
+    '''A Deadline that runs out after a number of expansions instead of a time, so a search stops at a set point.'''
+
+    def __init__(self, expansions):
+        super().__init__()
+        self.left = expansions
+
+    def expired(self):
+        self.left = self.left - 1
+        return self.left < 0
+
+
+##Tests that a search stopped every 50 expansions and resumed from a checkpoint (in the same process) expands the
+##same states, and finds the same cost, as the same search run without stopping.
+def test_checkpoint_resume():
+    score = 0
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'checkpoint')
+        details = ""
+        for strategy, compact, heur_fn in (('breadth_first', False, heur_zero), ('ucs', False, heur_zero),
+                                           ('ucs', True, heur_zero), ('astar', False, heur_manhattan_distance),
+                                           ('astar', True, heur_manhattan_distance)):
+            for problem in (PROBLEMS[20], PROBLEMS[21]):
+                se = SearchEngine(strategy, compact=compact)
+                se.init_search(problem, sokoban_goal_state, heur_fn)
+                final, stats = se.search(60)
+
+                se = SearchEngine(strategy, compact=compact)
+                se.init_search(problem, sokoban_goal_state, heur_fn)
+                resumed, resumed_stats = se.search(deadline=Expansions(50), checkpoint=path)
+                while not resumed:
+                    se = SearchEngine.resume(path, sokoban_goal_state, heur_fn)
+                    resumed, resumed_stats = se.search(deadline=Expansions(50), checkpoint=path)
+
+                if resumed.gval != final.gval or resumed_stats.states_expanded != stats.states_expanded \
+                        or len(resumed.path_actions()) != resumed.gval:
+                    details = "Failed checkpoint test: {} (compact={}) resumed found cost {} after {} expansions, " \
+                              "instead of {} after {}".format(strategy, compact, resumed.gval,
+                                                              resumed_stats.states_expanded, final.gval,
+                                                              stats.states_expanded)
+                    break
+            if details:
+                break
+        if not details:
+            score = 1
+    except Exception:
+        details = "One or more runtime errors occurred while testing checkpoints: %r" % traceback.format_exc()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return score, details
+
+
+##Tests that HDA* with 1, 2 and 3 workers finds solutions as cheap as A*.
+def test_hda_star():
+    score = 0
+    try:
+        details = ""
+        for problem in (PROBLEMS[2], PROBLEMS[4], PROBLEMS[20], PROBLEMS[21]):
+            se = SearchEngine('astar', 'full')
+            se.init_search(problem, sokoban_goal_state, heur_manhattan_distance)
+            final, _ = se.search(60)
+            for workers in (1, 2, 3):
+                engine = HDAStarEngine(workers=workers)
+                engine.init_search(problem, sokoban_goal_state, heur_manhattan_distance)
+                goal, _ = engine.search(60)
+                if not goal or goal.gval != final.gval or not sokoban_goal_state(goal) \
+                        or len(goal.path_actions()) != goal.gval:
+                    details = "Failed HDA* test: {} workers found cost {}, A* found {}".format(
+                        workers, goal and goal.gval, final.gval)
+                    break
+            if details:
+                break
+        if not details:
+            score = 1
+    except Exception:
+        details = "One or more runtime errors occurred while testing HDA*: %r" % traceback.format_exc()
+
+    return score, details
+
+
+##Tests that external memory breadth first search and ucs, with a RAM budget small enough to spill runs to disk,
+##find solutions as cheap as the in-memory searches.
+def test_external_search():
+    score = 0
+    try:
+        details = ""
+        for strategy in ('breadth_first', 'ucs'):
+            for problem in (PROBLEMS[2], PROBLEMS[20], PROBLEMS[21]):
+                se = SearchEngine(strategy, 'full')
+                se.init_search(problem, sokoban_goal_state)
+                final, _ = se.search(60)
+                engine = ExternalSearchEngine(strategy, ram_budget=256)
+                engine.init_search(problem, sokoban_goal_state)
+                goal, stats = engine.search(60)
+                if not goal or goal.gval != final.gval or not sokoban_goal_state(goal) \
+                        or len(goal.path_actions()) != goal.gval or stats.runs_spilled == 0:
+                    details = "Failed external search test: external {} found cost {} ({} runs spilled), " \
+                              "in-memory found {}".format(strategy, goal and goal.gval, stats.runs_spilled,
+                                                          final.gval)
+                    break
+            if details:
+                break
+        if not details:
+            score = 1
+    except Exception:
+        details = "One or more runtime errors occurred while testing external search: %r" % traceback.format_exc()
+
+    return score, details
+
+
+def main():
+    total = 0
+
+    print("---starting test_checkpoint_resume---")
+    score, details = test_checkpoint_resume()
+    total += score
+    print(details)
+    print("---finished test_checkpoint_resume---\n")
+
+    print("---starting test_hda_star---")
+    score, details = test_hda_star()
+    total += score
+    print(details)
+    print("---finished test_hda_star---\n")
+
+    print("---starting test_external_search---")
+    score, details = test_external_search()
+    total += score
+    print(details)
+    print("---finished test_external_search---\n")
+    print("Total score %d/3\n" % total)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,150 @@
     Code also contains a list of 20 Sokoban problems for the purpose of testing.
 '''
 
+import itertools
+import math
+import random
+import struct
+from collections import deque
+
 from search import *
 
+# Seed of the Zobrist tables. Fixed, so every process hashes a problem's states identically.
+_ZOBRIST_SEED = 384
+
+
+class SokobanMap:
+    '''
+    The parts of a Sokoban problem that never change while it is being solved.
+    Every state generated from a problem points to the same map instead of carrying its own copy.
+    '''
+    __slots__ = ('width', 'height', 'storage', 'obstacles', 'zobrist_boxes', 'zobrist_robots', 'verify_hashes',
+                 'hash_owners', 'board', 'dead', 'distances', 'prune_deadlocks')
+
+    def __init__(self, width, height, storage, obstacles):
+        '''
+        @param width: The room's X dimension (excluding walls).
+        @param height: The room's Y dimension (excluding walls).
+        @param storage: A frozenset of all the storage points.
+        @param obstacles: A frozenset of all the impassable obstacles.
+        '''
+        self.width = width
+        self.height = height
+        self.storage = storage
+        self.obstacles = obstacles
+        self.zobrist_boxes = None
+        self.zobrist_robots = []
+        # set verify_hashes to True to check every hashed state against all earlier states with the same key
+        self.verify_hashes = False
+        self.hash_owners = dict()
+        self.board = None
+        self.dead = None
+        self.distances = None
+        # set prune_deadlocks to False to generate pushes into dead squares and deadlocked positions as well
+        self.prune_deadlocks = True
+
+    def __getstate__(self):
+        '''
+        Pickles the map and its settings but none of the tables computed from it (dead squares, push distances, the
+        Zobrist tables, the BitBoard, the hashes seen), so a copy sent to another process starts cold and recomputes
+        them as needed. The Zobrist tables come from a fixed seed, so the copy hashes states identically.
+        '''
+        return self.width, self.height, self.storage, self.obstacles, self.verify_hashes, self.prune_deadlocks
+
+    def __setstate__(self, state):
+        width, height, storage, obstacles, verify_hashes, prune_deadlocks = state
+        self.__init__(width, height, storage, obstacles)
+        self.verify_hashes = verify_hashes
+        self.prune_deadlocks = prune_deadlocks
+
+    def dead_squares(self):
+        '''
+        Returns the frozenset of dead squares: floor locations from which a box can never be pushed to any storage
+        point, even with every other box removed. Computed once per map (see pull_distances).
+        '''
+        if self.dead is None:
+            alive = self.pull_distances(self.storage)
+            self.dead = frozenset((x, y) for x in range(self.width) for y in range(self.height)
+                                  if (x, y) not in alive and (x, y) not in self.obstacles)
+        return self.dead
+
+    def push_distances(self):
+        '''
+        Returns a dict mapping every location from which a box can reach storage to a tuple holding the least number
+        of pushes needed to bring a box from there to each storage point (in sorted storage order, math.inf if it
+        cannot), ignoring all other boxes. Computed once per map.
+        '''
+        if self.distances is None:
+            storage = sorted(self.storage)
+            per_storage = [self.pull_distances((point,)) for point in storage]
+            self.distances = dict((location, tuple(distances.get(location, math.inf) for distances in per_storage))
+                                  for location in self.pull_distances(storage))
+        return self.distances
+
+    def pull_distances(self, targets):
+        '''
+        Returns a dict mapping each location from which a box can be pushed to one of targets to the least number of
+        pushes needed, found by pulling boxes backwards from targets: a box can be pulled from t to t - d when both
+        t - d and t - 2d (where the pulling robot stands) are free.
+        '''
+        width = self.width
+        height = self.height
+        obstacles = self.obstacles
+
+        def free(location):
+            return 0 <= location[0] < width and 0 <= location[1] < height and location not in obstacles
+
+        distances = dict((location, 0) for location in targets if free(location))
+        frontier = deque(distances)
+        while frontier:
+            location = frontier.popleft()
+            for direction in (UP, RIGHT, DOWN, LEFT):
+                previous = direction.move(location)
+                if previous not in distances and free(previous) and free(direction.move(previous)):
+                    distances[previous] = distances[location] + 1
+                    frontier.append(previous)
+        return distances
+
+    def bitboard(self, n_robots):
+        '''Returns the BitBoard view of this map, used by SokobanBitState.'''
+        if self.board is None or len(self.board.zobrist_robots) < n_robots:
+            self.board = BitBoard(self, n_robots)
+        return self.board
+
+    def zobrist_key(self, robots, boxes):
+        '''
+        Computes the 64 bit Zobrist key of a configuration from scratch.
+        Successor states update their parent's key incrementally instead (see SokobanState.successors).
+        '''
+        self.zobrist_tables(len(robots))
+        width = self.width
+        key = 0
+        for robot, location in enumerate(robots):
+            key ^= self.zobrist_robots[robot][location[1] * width + location[0]]
+        for box in boxes:
+            key ^= self.zobrist_boxes[box[1] * width + box[0]]
+        return key
+
+    def zobrist_tables(self, n_robots):
+        '''
+        Returns the random keys of a box, and of each of n_robots robots, on every cell (indexed y * width + x).
+        '''
+        if self.zobrist_boxes is None or len(self.zobrist_robots) < n_robots:
+            rng = random.Random(_ZOBRIST_SEED)
+            cells = self.width * self.height
+            self.zobrist_boxes = [rng.getrandbits(64) for _ in range(cells)]
+            self.zobrist_robots = [[rng.getrandbits(64) for _ in range(cells)] for _ in range(n_robots)]
+        return self.zobrist_boxes, self.zobrist_robots
+
+    def verify_hash(self, key, robots, boxes):
+        '''Raises an exception if a different configuration was already hashed to key.'''
+        owner = self.hash_owners.setdefault(key, (robots, boxes))
+        if owner != (robots, boxes):
+            raise Exception("Zobrist hash collision: {} and {} both hash to {}".format(owner, (robots, boxes), key))
+
 
 class SokobanState(StateSpace):
+    __slots__ = ('robots', 'boxes', 'static_map', 'key')
 
     def __init__(self, action, gval, parent, width, height, robots, boxes, storage, obstacles):
         '''
@@ -22,20 +162,56 @@ class SokobanState(StateSpace):
         @param obstacles: A frozenset of all the impassable obstacles.
         '''
         StateSpace.__init__(self, action, gval, parent)
-        self.width = width
-        self.height = height
         self.robots = robots
         self.boxes = boxes
-        self.storage = storage
-        self.obstacles = obstacles
+        self.static_map = SokobanMap(width, height, storage, obstacles)
+        self.key = None
+
+    @classmethod
+    def from_map(cls, action, gval, parent, static_map, robots, boxes, key=None):
+        '''
+        Creates a new Sokoban state that shares an existing static map.
+        @param static_map: The SokobanMap of the problem the state belongs to.
+        @param key: The state's Zobrist key, if already known.
+        '''
+        state = cls.__new__(cls)
+        StateSpace.__init__(state, action, gval, parent)
+        state.robots = robots
+        state.boxes = boxes
+        state.static_map = static_map
+        state.key = key
+        return state
+
+    @property
+    def width(self):
+        return self.static_map.width
+
+    @property
+    def height(self):
+        return self.static_map.height
+
+    @property
+    def storage(self):
+        return self.static_map.storage
+
+    @property
+    def obstacles(self):
+        return self.static_map.obstacles
 
     def successors(self):
         '''
         Generates all the actions that can be performed from this state, and the states those actions will create.
         '''
-        successors = []
+        successors = Successors()
         transition_cost = 1
         moved_boxes = frozenset()
+        static_map = self.static_map
+        dead = static_map.dead_squares() if static_map.prune_deadlocks else frozenset()
+        width = static_map.width
+        height = static_map.height
+        obstacles = static_map.obstacles
+        key = self.hashable_state()
+        zobrist_boxes, zobrist_robots = static_map.zobrist_tables(len(self.robots))
 
         for robot in range(0, len(self.robots)):
             for direction in (UP, RIGHT, DOWN, LEFT):
@@ -43,14 +219,14 @@ class SokobanState(StateSpace):
                 new_robots = list(self.robots);
                 new_robots.remove(self.robots[robot])
                 new_robots = tuple(new_robots)
-                new_boxes = set(self.boxes)
-                new_moved_boxes = set(moved_boxes)
+                new_boxes = self.boxes
+                new_key = key
 
-                if new_location[0] < 0 or new_location[0] >= self.width:
+                if new_location[0] < 0 or new_location[0] >= width:
                     continue
-                if new_location[1] < 0 or new_location[1] >= self.height:
+                if new_location[1] < 0 or new_location[1] >= height:
                     continue
-                if new_location in self.obstacles:
+                if new_location in obstacles:
                     continue
                 if new_location in new_robots:
                     continue
@@ -60,35 +236,94 @@ class SokobanState(StateSpace):
                 if new_location in self.boxes:
                     new_box_location = direction.move(new_location)
 
-                    if new_box_location[0] < 0 or new_box_location[0] >= self.width:
+                    if new_box_location[0] < 0 or new_box_location[0] >= width:
                         continue
-                    if new_box_location[1] < 0 or new_box_location[1] >= self.height:
+                    if new_box_location[1] < 0 or new_box_location[1] >= height:
                         continue
-                    if new_box_location in self.obstacles:
+                    if new_box_location in obstacles:
                         continue
                     if new_box_location in new_robots:
                         continue
                     if new_box_location in new_boxes:
                         continue
+                    if new_box_location in dead:
+                        successors.pruned += 1
+                        continue
 
+                    # boxes are only copied when one is pushed; plain robot moves share the parent's frozenset
+                    new_boxes = set(new_boxes)
                     new_boxes.remove(new_location)
                     new_boxes.add(new_box_location)
-                    new_moved_boxes.add(new_box_location)
+                    new_boxes = frozenset(new_boxes)
+                    if static_map.prune_deadlocks:
+                        board = static_map.bitboard(len(self.robots))
+                        if board.deadlocked(board.bits(new_boxes), board.cell(new_box_location)):
+                            successors.pruned += 1
+                            continue
+                    new_key ^= zobrist_boxes[new_location[1] * width + new_location[0]]
+                    new_key ^= zobrist_boxes[new_box_location[1] * width + new_box_location[0]]
 
                 new_robots = list(self.robots)
                 new_robots[robot] = new_location
                 new_robots = tuple(new_robots)
+                old_location = self.robots[robot]
+                new_key ^= zobrist_robots[robot][old_location[1] * width + old_location[0]]
+                new_key ^= zobrist_robots[robot][new_location[1] * width + new_location[0]]
 
-                new_state = SokobanState(str(robot) + " " + direction.name, self.gval + transition_cost, self,
-                                         self.width, self.height, new_robots, frozenset(new_boxes), self.storage,
-                                         self.obstacles)
+                new_state = SokobanState.from_map(action_name(robot, direction), self.gval + transition_cost,
+                                                  self, static_map, new_robots, new_boxes, new_key)
                 successors.append(new_state)
 
         return successors
 
+    def predecessors(self):
+        '''
+        Generates the states from which a single action leads to this state: a robot steps back from where it stands,
+        either leaving a box in front of it where it is or pulling that box back along with it.
+        '''
+        predecessors = []
+        static_map = self.static_map
+        width = static_map.width
+        key = self.hashable_state()
+        zobrist_boxes, zobrist_robots = static_map.zobrist_tables(len(self.robots))
+
+        for robot in range(0, len(self.robots)):
+            location = self.robots[robot]
+            for direction in (UP, RIGHT, DOWN, LEFT):
+                old_location = (location[0] - direction.delta[0], location[1] - direction.delta[1])
+                if old_location[0] < 0 or old_location[0] >= width:
+                    continue
+                if old_location[1] < 0 or old_location[1] >= static_map.height:
+                    continue
+                if old_location in static_map.obstacles or old_location in self.robots or old_location in self.boxes:
+                    continue
+
+                new_robots = self.robots[:robot] + (old_location,) + self.robots[robot + 1:]
+                new_key = key ^ zobrist_robots[robot][location[1] * width + location[0]] \
+                    ^ zobrist_robots[robot][old_location[1] * width + old_location[0]]
+                predecessors.append(SokobanState.from_map(action_name(robot, direction), self.gval + 1, self,
+                                                          static_map, new_robots, self.boxes, new_key))
+
+                box = direction.move(location)
+                if box in self.boxes:
+                    new_boxes = frozenset(self.boxes - {box} | {location})
+                    new_key ^= zobrist_boxes[box[1] * width + box[0]] ^ zobrist_boxes[location[1] * width + location[0]]
+                    predecessors.append(SokobanState.from_map(action_name(robot, direction), self.gval + 1, self,
+                                                              static_map, new_robots, new_boxes, new_key))
+
+        return predecessors
+
     def hashable_state(self):
-        '''Return a data item that can be used as a dictionary key to UNIQUELY represent a state.'''
-        return hash((self.robots, self.boxes))
+        '''
+        Return a data item that can be used as a dictionary key to UNIQUELY represent a state.
+        This is the state's 64 bit Zobrist key, computed once and then updated incrementally by successors.
+        '''
+        key = self.key
+        if key is None:
+            key = self.key = self.static_map.zobrist_key(self.robots, self.boxes)
+        if self.static_map.verify_hashes:
+            self.static_map.verify_hash(key, self.robots, self.boxes)
+        return key
 
     def state_string(self):
         '''Returns a string representation fo a state that can be printed to stdout.'''
@@ -135,14 +370,432 @@ class SokobanState(StateSpace):
         print("ACTION was " + self.action)
         print(self.state_string())
 
+    def box_configuration(self):
+        '''Returns a hashable key identifying the problem and where the boxes (but not the robots) are.'''
+        return (self.static_map, self.boxes)
+
+    def pack(self):
+        '''
+        Returns the state as bytes: the cell (y * width + x) of each robot as 2 bytes, then a bitmask of the cells
+        holding a box. Push-level states pack their exact robot positions, as their actions walk from them.
+        '''
+        width = self.static_map.width
+        bits = 0
+        for box in self.boxes:
+            bits |= 1 << (box[1] * width + box[0])
+        return struct.pack('<{}H'.format(len(self.robots)), *[y * width + x for x, y in self.robots]) \
+            + bits.to_bytes((width * self.static_map.height + 7) // 8, 'little')
+
+    def unpack(self, data, gval=0):
+        '''Returns the state of this problem packed into data by pack(), as an initial state (without parent).'''
+        width = self.static_map.width
+        n_robots = len(self.robots)
+        robots = tuple((cell % width, cell // width) for cell in struct.unpack_from('<{}H'.format(n_robots), data))
+        bits = int.from_bytes(data[2 * n_robots:], 'little')
+        boxes = []
+        while bits:
+            low = bits & -bits
+            cell = low.bit_length() - 1
+            boxes.append((cell % width, cell // width))
+            bits ^= low
+        state = SokobanState.from_map("START", gval, None, self.static_map, robots, frozenset(boxes))
+        # the other representations are made from a SokobanState
+        return state if type(self) is SokobanState else type(self).from_state(state)
+
+    def is_goal(self):
+        '''Returns True if every box is in storage.'''
+        storage = self.static_map.storage
+        for box in self.boxes:
+            if box not in storage:
+                return False
+        return True
+
+
+class BitBoard:
+    '''
+    The bitmask view of a SokobanMap.
+    Cells are numbered (y + 1) * stride + (x + 1) on the room padded with a ring of walls (stride is width + 2),
+    so moving in a direction is adding a constant and bounds checks become wall checks.
+    '''
+    __slots__ = ('stride', 'walls', 'storage', 'dead', 'moves', 'zobrist_boxes', 'zobrist_robots')
+
+    def __init__(self, static_map, n_robots):
+        width = static_map.width
+        height = static_map.height
+        self.stride = stride = width + 2
+        self.walls = 0
+        for y in range(-1, height + 1):
+            for x in range(-1, width + 1):
+                if x < 0 or x >= width or y < 0 or y >= height or (x, y) in static_map.obstacles:
+                    self.walls |= 1 << self.cell((x, y))
+        self.storage = self.bits(static_map.storage)
+        self.dead = self.bits(static_map.dead_squares())
+        self.moves = tuple((direction, direction.delta[1] * stride + direction.delta[0])
+                           for direction in (UP, RIGHT, DOWN, LEFT))
+
+        # the map's Zobrist keys re-indexed by padded cell, so both representations hash a state identically
+        zobrist_boxes, zobrist_robots = static_map.zobrist_tables(n_robots)
+        self.zobrist_boxes = [0] * (stride * (height + 2))
+        self.zobrist_robots = [[0] * (stride * (height + 2)) for _ in range(n_robots)]
+        for y in range(height):
+            for x in range(width):
+                cell = self.cell((x, y))
+                self.zobrist_boxes[cell] = zobrist_boxes[y * width + x]
+                for robot in range(n_robots):
+                    self.zobrist_robots[robot][cell] = zobrist_robots[robot][y * width + x]
+
+    def cell(self, location):
+        return (location[1] + 1) * self.stride + location[0] + 1
+
+    def location(self, cell):
+        return (cell % self.stride - 1, cell // self.stride - 1)
+
+    def bits(self, locations):
+        '''Returns the bitmask with the cells of locations set.'''
+        bits = 0
+        for location in locations:
+            bits |= 1 << self.cell(location)
+        return bits
+
+    def deadlocked(self, boxes, cell):
+        '''
+        Checks the neighbourhood of the box just pushed to cell for a deadlock, given the bitmask of all boxes.
+        Returns True if the box completes a 2x2 block of boxes and walls, or belongs to a group of frozen boxes
+        (boxes that can be pushed along neither axis), with at least one box of the block or group off storage.
+        Robots are never treated as walls, since they can move away.
+        '''
+        stride = self.stride
+        solid = self.walls | boxes
+        loose = boxes & ~self.storage
+        for corner in (cell, cell - 1, cell - stride, cell - stride - 1):
+            square = (1 << corner) | (1 << corner + 1) | (1 << corner + stride) | (1 << corner + stride + 1)
+            if solid & square == square and loose & square:
+                return True
+
+        frozen = []
+        if self._frozen(cell, boxes, 0, frozen):
+            for frozen_cell in frozen:
+                if loose & (1 << frozen_cell):
+                    return True
+        return False
+
+    def _frozen(self, cell, boxes, visiting, frozen):
+        '''
+        Returns True if the box on cell cannot move along either axis, appending the cells of all boxes found
+        frozen to frozen. Boxes in the visiting bitmask (the ones whose freeze depends on this one) count as walls.
+        '''
+        visiting |= 1 << cell
+        mark = len(frozen)
+        for delta in (1, self.stride):
+            before = 1 << cell - delta
+            after = 1 << cell + delta
+            if (self.walls | visiting) & (before | after):
+                continue
+            if self.dead & before and self.dead & after:
+                continue
+            if boxes & before and self._frozen(cell - delta, boxes, visiting, frozen):
+                continue
+            if boxes & after and self._frozen(cell + delta, boxes, visiting, frozen):
+                continue
+            # the box can move along this axis; forget boxes only found frozen by assuming it could not
+            del frozen[mark:]
+            return False
+        frozen.append(cell)
+        return True
+
+    def locations(self, bits):
+        '''Returns the frozenset of locations whose cells are set in bits.'''
+        locations = []
+        while bits:
+            low = bits & -bits
+            locations.append(self.location(low.bit_length() - 1))
+            bits ^= low
+        return frozenset(locations)
+
+
+class SokobanBitState(SokobanState):
+    '''
+    A Sokoban state in packed form: the boxes are a bitmask over the cells of the map's BitBoard and the robots a
+    tuple of cell numbers, so legality checks, goal tests and hashing are a few integer operations.
+    It generates the same successors, in the same order and with the same keys, as the SokobanState it was made from,
+    so a search finds identical solutions with either representation.
+    robots and boxes are still available (decoded on each access) for heuristics and printing.
+    '''
+    __slots__ = ('robot_cells', 'box_bits')
+
+    def __init__(self, action, gval, parent, static_map, robot_cells, box_bits, key=None):
+        '''
+        Creates a new packed Sokoban state.
+        @param static_map: The SokobanMap of the problem the state belongs to.
+        @param robot_cells: A tuple with the BitBoard cell of each robot.
+        @param box_bits: The bitmask of the BitBoard cells holding a box.
+        @param key: The state's Zobrist key, if already known.
+        '''
+        StateSpace.__init__(self, action, gval, parent)
+        self.static_map = static_map
+        self.robot_cells = robot_cells
+        self.box_bits = box_bits
+        self.key = key
+
+    @classmethod
+    def from_state(cls, state):
+        '''Returns the packed equivalent of a SokobanState (as an initial state: without parent).'''
+        board = state.static_map.bitboard(len(state.robots))
+        return cls(state.action, state.gval, None, state.static_map,
+                   tuple(board.cell(robot) for robot in state.robots), board.bits(state.boxes), state.key)
+
+    @property
+    def robots(self):
+        board = self.static_map.board
+        return tuple(board.location(cell) for cell in self.robot_cells)
+
+    @property
+    def boxes(self):
+        return self.static_map.board.locations(self.box_bits)
+
+    def successors(self):
+        '''
+        Generates all the actions that can be performed from this state, and the states those actions will create.
+        '''
+        successors = Successors()
+        static_map = self.static_map
+        board = static_map.bitboard(len(self.robot_cells))
+        prune_deadlocks = static_map.prune_deadlocks
+        dead = board.dead if prune_deadlocks else 0
+        zobrist_boxes = board.zobrist_boxes
+        robot_cells = self.robot_cells
+        boxes = self.box_bits
+        key = self.hashable_state()
+        gval = self.gval + 1
+
+        robot_bits = 0
+        for cell in robot_cells:
+            robot_bits |= 1 << cell
+        blocked = board.walls | robot_bits
+
+        for robot, cell in enumerate(robot_cells):
+            zobrist_robot = board.zobrist_robots[robot]
+            for direction, delta in board.moves:
+                new_cell = cell + delta
+                bit = 1 << new_cell
+                if blocked & bit:
+                    continue
+                new_boxes = boxes
+                new_key = key
+                if boxes & bit:
+                    box_cell = new_cell + delta
+                    box_bit = 1 << box_cell
+                    if (blocked | boxes) & box_bit:
+                        continue
+                    if dead & box_bit:
+                        successors.pruned += 1
+                        continue
+                    new_boxes = boxes ^ bit ^ box_bit
+                    if prune_deadlocks and board.deadlocked(new_boxes, box_cell):
+                        successors.pruned += 1
+                        continue
+                    new_key ^= zobrist_boxes[new_cell] ^ zobrist_boxes[box_cell]
+                new_key ^= zobrist_robot[cell] ^ zobrist_robot[new_cell]
+                new_robots = robot_cells[:robot] + (new_cell,) + robot_cells[robot + 1:]
+                successors.append(SokobanBitState(action_name(robot, direction), gval, self, static_map,
+                                                  new_robots, new_boxes, new_key))
+        return successors
+
+    def hashable_state(self):
+        '''Return a data item that can be used as a dictionary key to UNIQUELY represent a state.'''
+        key = self.key
+        if key is None:
+            key = self.key = self.static_map.zobrist_key(self.robots, self.boxes)
+        if self.static_map.verify_hashes:
+            self.static_map.verify_hash(key, self.robots, self.boxes)
+        return key
+
+    def box_configuration(self):
+        '''Returns a hashable key identifying the problem and where the boxes (but not the robots) are.'''
+        return (self.static_map, self.box_bits)
+
+    def is_goal(self):
+        '''Returns True if every box is in storage.'''
+        return self.box_bits & ~self.static_map.board.storage == 0
+
+class SokobanPushState(SokobanState):
+    '''
+    A Sokoban state whose successors are whole pushes (macro moves) rather than single robot steps.
+    For every robot, a breadth first walk over the free floor finds where it can go without pushing anything; every
+    box it can push from one of those cells gives one successor, whose cost is the walk plus the push and whose
+    action names all the steps, separated by "; ".
+    With a single robot, states are hashed with the robot normalised to the first cell (in reading order) of the area
+    it can walk to, so states that only differ by walking merge. Walks move one robot while the others stand still,
+    so with several robots single steps are generated too (a robot may have to step aside for another) and states
+    are hashed with their exact robot positions; pushes then act as shortcuts.
+    Merging walks gives up optimality: the gval of a state includes its own walk, so cycle checking keeps the copy
+    reached more cheaply even when the robot position of the other copy leads to a shorter continuation. Use
+    SokobanExactPushState with the optimal strategies (astar, ucs).
+    print_path replays the steps to show the full step-by-step path.
+    '''
+    __slots__ = ()
+
+    @classmethod
+    def from_state(cls, state):
+        '''Returns the push-level equivalent of a SokobanState (as an initial state: without parent).'''
+        return cls.from_map(state.action, state.gval, None, state.static_map, state.robots, state.boxes)
+
+    def successors(self):
+        '''
+        Generates every push the robots can walk to and make from this state, and the states those pushes create.
+        '''
+        successors = Successors()
+        static_map = self.static_map
+        dead = static_map.dead_squares() if static_map.prune_deadlocks else frozenset()
+        boxes = self.boxes
+
+        for robot in range(0, len(self.robots)):
+            others = self.robots[:robot] + self.robots[robot + 1:]
+            walks = self.walks(robot)
+            for location in walks:
+                for direction in (UP, RIGHT, DOWN, LEFT):
+                    box = direction.move(location)
+                    if box not in boxes:
+                        continue
+                    new_box_location = direction.move(box)
+                    if not self.free(new_box_location) or new_box_location in boxes or new_box_location in others:
+                        continue
+                    if new_box_location in dead:
+                        successors.pruned += 1
+                        continue
+                    new_boxes = frozenset(boxes - {box} | {new_box_location})
+                    if static_map.prune_deadlocks:
+                        board = static_map.bitboard(len(self.robots))
+                        if board.deadlocked(board.bits(new_boxes), board.cell(new_box_location)):
+                            successors.pruned += 1
+                            continue
+
+                    steps = []
+                    step = location
+                    while walks[step]:
+                        step, walk_direction = walks[step]
+                        steps.append(action_name(robot, walk_direction))
+                    steps.reverse()
+                    steps.append(action_name(robot, direction))
+
+                    new_robots = others[:robot] + (box,) + others[robot:]
+                    successors.append(type(self).from_map("; ".join(steps), self.gval + len(steps), self,
+                                                          static_map, new_robots, new_boxes))
+
+            if others:
+                # another robot may have to step aside first (e.g., off the cell a box must go to)
+                for direction in (UP, RIGHT, DOWN, LEFT):
+                    new_location = direction.move(self.robots[robot])
+                    if new_location in walks:
+                        new_robots = others[:robot] + (new_location,) + others[robot:]
+                        successors.append(type(self).from_map(action_name(robot, direction), self.gval + 1,
+                                                              self, static_map, new_robots, boxes))
+        return successors
+
+    def free(self, location):
+        '''Returns True if location is inside the room and not an obstacle.'''
+        return 0 <= location[0] < self.static_map.width and 0 <= location[1] < self.static_map.height \
+            and location not in self.static_map.obstacles
+
+    def walks(self, robot):
+        '''
+        Returns a dict mapping every location robot can walk to without pushing (boxes and the other robots stay put),
+        in breadth first order, to the location and direction it is entered from (None for the robot's own location).
+        '''
+        start = self.robots[robot]
+        blocked = self.boxes.union(self.robots)
+        walks = {start: None}
+        frontier = deque([start])
+        while frontier:
+            location = frontier.popleft()
+            for direction in (UP, RIGHT, DOWN, LEFT):
+                new_location = direction.move(location)
+                if new_location not in walks and new_location not in blocked and self.free(new_location):
+                    walks[new_location] = (location, direction)
+                    frontier.append(new_location)
+        return walks
+
+    def hashable_state(self):
+        '''Return a data item that can be used as a dictionary key to UNIQUELY represent a state up to walking.'''
+        key = self.key
+        if key is None:
+            key = self.key = self.static_map.zobrist_key(self.normalised_robots(), self.boxes)
+        if self.static_map.verify_hashes:
+            self.static_map.verify_hash(key, self.normalised_robots(), self.boxes)
+        return key
+
+    def normalised_robots(self):
+        '''Returns the robots, with a single robot moved to the first cell (in reading order) of the area it can walk to.'''
+        if len(self.robots) > 1:
+            return self.robots
+        return (min(self.walks(0), key=lambda location: (location[1], location[0])),)
+
+    def step_path(self):
+        '''Returns the SokobanState reached by replaying every single step on the path to self, with its parent chain.'''
+        root = self
+        while root.parent:
+            root = root.parent
+        start = SokobanState.from_map(root.action, root.gval, None, self.static_map, root.robots, root.boxes)
+        return start.replay([step for action in self.path_actions() for step in action.split("; ")])
+
+    def print_path(self):
+        '''print the sequence of single steps used to reach self'''
+        self.step_path().print_path()
+
+
+class SokobanExactPushState(SokobanPushState):
+    '''
+    A SokobanPushState hashed with its exact robot positions even with a single robot, so no two states with
+    different walking costs ahead of them merge. Every step path is a sequence of walks each ending in a push (a final
+    walk never helps reach a goal), so searching pushes from exact positions loses no solution and astar and ucs stay
+    optimal, at the price of one state per position the robot can push from.
+    '''
+    __slots__ = ()
+
+    def normalised_robots(self):
+        '''Returns the robots, as they are.'''
+        return self.robots
+
+
+_ACTION_NAMES = dict()
+
+
+def action_name(robot, direction):
+    '''Returns the name of the action moving robot in direction. Names are shared between states.'''
+    name = _ACTION_NAMES.get((robot, direction.name))
+    if name is None:
+        name = _ACTION_NAMES[(robot, direction.name)] = str(robot) + " " + direction.name
+    return name
+
+
+def box_key(state):
+    '''Key function for a CachedHeuristic wrapping a heuristic that only depends on the boxes.'''
+    return state.box_configuration()
+
+
 def sokoban_goal_state(state):
     '''Returns True if we have reached a goal state'''
     '''INPUT: a sokoban state'''
     '''OUTPUT: True (if goal) or False (if not)'''
-    for box in state.boxes:
-        if box not in state.storage:
-            return False
-    return True
+    return state.is_goal()
+
+
+def sokoban_goal_states(state):
+    '''
+    Generates every goal state of state's problem, for searching backwards from: the boxes fill storage points (each
+    choice of them, if there are more storage points than boxes) and the robots stand anywhere else.
+    Their number grows quickly with the number of robots: the robots are labelled, so every placement of them is a
+    goal state of its own, and the 8x8 problems have hundreds of thousands to millions of them. Seeding a backward
+    search with them is only practical on the smaller maps.
+    '''
+    static_map = state.static_map
+    floor = [(x, y) for y in range(static_map.height) for x in range(static_map.width)
+             if (x, y) not in static_map.obstacles]
+    for boxes in itertools.combinations(sorted(static_map.storage), len(state.boxes)):
+        boxes = frozenset(boxes)
+        for robots in itertools.permutations([location for location in floor if location not in boxes],
+                                             len(state.robots)):
+            yield SokobanState.from_map("GOAL", 0, None, static_map, robots, boxes)
 
 '''
 Sokoban Problem Set, for testing
@@ -6,22 +6,20 @@
 #   You may not remove any imports.
 #   You may not import or otherwise source any of your own files
 
-import os  # for time functions
 import math  # for infinity
 import heapq
+import threading
 import time
+from collections import OrderedDict
 
 from search import *  # for search engines
-from sokoban import SokobanState, Direction, PROBLEMS  # for Sokoban specific classes and problems
+from sokoban import SokobanState, Direction, PROBLEMS, box_key  # for Sokoban specific classes and problems
 
 def sokoban_goal_state(state: SokobanState):
     '''
     @return: Whether all boxes are stored.
     '''
-    for box in state.boxes:
-        if box not in state.storage:
-            return False
-    return True
+    return state.is_goal()
 
 def heur_manhattan_distance(state: SokobanState):
     # IMPLEMENT
@@ -89,6 +87,12 @@ def heur_alternate(state: SokobanState):
     storage_list = [ele for ele in storage_list if ele not in placed_boxes]
     board_size = [state.width, state.height]
 
+    # a box on a dead square (precomputed once per map) can never reach storage
+    dead_squares = state.static_map.dead_squares()
+    for box in box_list:
+        if box in dead_squares:
+            return math.inf
+
     # below checks whether a box is at a corner
     stucked_box = check_stuck(box_list, placed_boxes, state.obstacles, robot_list, board_size)
     if stucked_box:
@@ -168,6 +172,156 @@ def check_stuck(box_list, placed_boxes, obstacles, robot_list, board_size) -> bo
             return True
     return False
 
+# cost of matching a box to a storage point it can never reach; keeps the assignment problem finite
+_UNREACHABLE = 10 ** 6
+# how many box configurations keep their matching around for their successors to reuse
+_MATCHING_CACHE_SIZE = 10000
+# the matchings kept, one cache per thread, so searches running at the same time neither evict each other's
+# matchings nor race on the cache
+_local = threading.local()
+
+
+def heur_matching(state: SokobanState):
+    '''admissible sokoban heuristic: optimal box to storage assignment'''
+    '''INPUT: a sokoban state'''
+    '''OUTPUT: a numeric value that serves as an estimate of the distance of the state to the goal.'''
+    # Every box is matched to a different storage point so that the total number of pushes is as small as possible,
+    # where push distances are precomputed once per map around the walls (see SokobanMap.push_distances) rather than
+    # Manhattan distances. Every push is a move, so this never overestimates.
+    # When only one box moved since the parent state, the parent's matching is repaired with a single
+    # Hungarian phase instead of being solved from scratch.
+    matchings = getattr(_local, 'matchings', None)
+    if matchings is None:
+        matchings = _local.matchings = OrderedDict()
+    key = state.box_configuration()
+    matching = matchings.get(key)
+    if matching is not None:
+        matchings.move_to_end(key)
+        return matching.value
+
+    parent = state.parent
+    if parent is not None:
+        parent_matching = matchings.get(parent.box_configuration())
+        if parent_matching is not None:
+            moved_from = parent.boxes - state.boxes
+            moved_to = state.boxes - parent.boxes
+            if len(moved_from) == 1 and len(moved_to) == 1:
+                matching = parent_matching.move(next(iter(moved_from)), next(iter(moved_to)),
+                                                state.static_map.push_distances())
+    if matching is None:
+        matching = _Matching(state.boxes, state.static_map.push_distances(), len(state.storage))
+
+    matchings[key] = matching
+    if len(matchings) > _MATCHING_CACHE_SIZE:
+        matchings.popitem(last=False)
+    return matching.value
+
+
+class _Matching:
+    '''
+    A min-cost assignment of boxes to storage points, kept with the dual potentials of the Hungarian algorithm so it
+    can be repaired in O(n^2) when one box moves. Rows 1..n are the boxes, padded with dummy rows (None) of cost 0 up
+    to the number of storage points so the problem is square; columns 1..n are the storage points in sorted order.
+    '''
+    __slots__ = ('rows', 'costs', 'u', 'v', 'p', 'value')
+
+    def __init__(self, boxes, distances, n_storage):
+        if len(boxes) > n_storage:
+            self.rows = None
+            self.value = math.inf
+            return
+        self.rows = list(boxes) + [None] * (n_storage - len(boxes))
+        self.costs = [None] + [_box_costs(box, distances, n_storage) for box in self.rows]
+        self.u = [0] * (n_storage + 1)
+        self.v = [0] * (n_storage + 1)
+        self.p = [0] * (n_storage + 1)
+        for row in range(1, n_storage + 1):
+            self._augment(row)
+        self._evaluate()
+
+    def move(self, old_box, new_box, distances):
+        '''Returns the matching for the same boxes except old_box moved to new_box.'''
+        if self.rows is None:
+            return self
+        matching = _Matching.__new__(_Matching)
+        matching.rows = list(self.rows)
+        matching.costs = list(self.costs)
+        matching.u = list(self.u)
+        matching.v = list(self.v)
+        matching.p = list(self.p)
+
+        row = matching.rows.index(old_box) + 1
+        matching.rows[row - 1] = new_box
+        costs = matching.costs[row] = _box_costs(new_box, distances, len(matching.rows))
+        matching.p[matching.p.index(row, 1)] = 0
+        # lowest potential keeping every reduced cost of the new row non-negative
+        matching.u[row] = min(costs[j] - matching.v[j] for j in range(1, len(costs)))
+        matching._augment(row)
+        matching._evaluate()
+        return matching
+
+    def _augment(self, row):
+        '''One phase of the Hungarian algorithm: assigns the unassigned row along a shortest augmenting path.'''
+        costs, u, v, p = self.costs, self.u, self.v, self.p
+        n = len(p) - 1
+        minv = [math.inf] * (n + 1)
+        used = [False] * (n + 1)
+        way = [0] * (n + 1)
+        p[0] = row
+        j0 = 0
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            delta = math.inf
+            j1 = 0
+            row_costs = costs[i0]
+            for j in range(1, n + 1):
+                if not used[j]:
+                    cur = row_costs[j] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(n + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    def _evaluate(self):
+        total = 0
+        for j in range(1, len(self.p)):
+            total += self.costs[self.p[j]][j]
+        self.value = math.inf if total >= _UNREACHABLE else total
+
+
+def _box_costs(box, distances, n_storage):
+    '''The row of the assignment problem for box (1-indexed; dummy rows cost nothing).'''
+    if box is None:
+        return [0] * (n_storage + 1)
+    row = distances.get(box)
+    if row is None:
+        return [0] + [_UNREACHABLE] * n_storage
+    return [0] + [_UNREACHABLE if d == math.inf else d for d in row]
+
+
+# The heuristics above that only depend on where the boxes are, behind a bounded cache shared by all states with the
+# same boxes (most successors only move a robot). Engines using them at the same time share the cache, but each
+# counts its own hits and misses (see CachedHeuristic.view).
+heur_manhattan_cached = CachedHeuristic(heur_manhattan_distance, box_key)
+heur_matching_cached = CachedHeuristic(heur_matching, box_key)
+
+
 def heur_zero(state: SokobanState):
     '''Zero Heuristic can be used to make A* search perform uniform cost search'''
     return 0
@@ -203,33 +357,14 @@ def iterative_astar(initial_state, heur_fn, weight=1, timebound=5):  # uses f(n)
     '''OUTPUT: A goal state (if a goal is found), else False as well as a SearchStats object'''
     '''implementation of realtime astar algorithm'''
 
-    start_time = os.times()[0]
-    remain_time = timebound
-    i = 0
-    g_val = math.inf
-    h_val = math.inf
-    f_val = g_val + weight * h_val
-    costbound = (g_val, h_val, f_val)
+    # one ARA* search keeps its tree while the weight decreases, instead of restarting for each weight
+    se = SearchEngine('custom', 'default')
+    se.init_search(initial_state, goal_fn=sokoban_goal_state, heur_fn=heur_fn)
     best_final = None
     best_stats = None
-    while remain_time > 0:
-        # same as weighted a* #
-        se = SearchEngine('custom', 'default')
-        wrapped_fval_function = (lambda sN: fval_function(sN, weight))
-        se.init_search(initial_state, goal_fn=sokoban_goal_state, heur_fn=heur_fn,
-                       fval_function=wrapped_fval_function)
-        # end same as weighted a* #
-        final, stats = se.search(timebound, costbound)
-
-        if final:
-            costbound = (final.gval, 0, final.gval)
-            best_final = final
-            best_stats = stats
-        elif final is None or final is False:
-            return best_final, best_stats
-        remain_time = timebound - (os.times()[0] - start_time)
-        i += 1
-        weight = weight / 1.5
+    for final, stats in se.anytime_search(weight, timebound):
+        best_final = final
+        best_stats = stats
     return best_final, best_stats
 
 
@@ -239,21 +374,20 @@ def iterative_gbfs(initial_state, heur_fn, timebound=5):  # only use h(n)
     '''INPUT: a sokoban state that represents the start state and a timebound (number of seconds)'''
     '''OUTPUT: A goal state (if a goal is found), else False'''
     '''implementation of anytime gbf algorithm'''
-    start_time = os.times()[0]
-    remain_time = timebound
-    i = 0
+    # every search draws on the same budget, so together they stay within timebound
+    deadline = Deadline(timebound)
     g_val = math.inf
     h_val = math.inf
     f_val = g_val + h_val
     costbound = (g_val, h_val, f_val)
     best_final = None
     best_stats = None
-    while remain_time > 0:
+    while deadline.remaining() > 0:
 
         se = SearchEngine('best_first', 'default')
         se.init_search(initial_state, goal_fn=sokoban_goal_state, heur_fn=heur_fn)
 
-        final, stats = se.search(timebound, costbound)
+        final, stats = se.search(costbound=costbound, deadline=deadline)
 
         if final:
             costbound = (final.gval, 0, final.gval)
@@ -261,8 +395,6 @@ def iterative_gbfs(initial_state, heur_fn, timebound=5):  # only use h(n)
             best_stats = stats
         elif final is None or final is False:
             return best_final, best_stats
-        remain_time = timebound - (os.times()[0] - start_time)
-        i += 1
 
     return best_final, best_stats
 